@@ -1,6 +1,10 @@
-from django.contrib import admin
-from .models import DataSource, DataPreset, TransformationStep
+from django.contrib import admin, messages
+from django.utils import timezone
+from .models import DataSource, DataPreset, TransformationStep, PresetSnapshot
 from .forms import DataSourceForm, TransformationStepForm
+from .utils.data_import import fetch_source_data
+from .utils.preset_io import restore_snapshot, snapshot_preset
+from .utils.schema import infer_schema
 
 """
 admin.py – Custom Django admin configuration for managing DataSource, DataPreset, and TransformationStep.
@@ -14,9 +18,13 @@ Customizations include:
    - Uses a custom form (DataSourceForm) that replaces the raw JSONField (`config`) with a text area (`config_pretty`)
      for editing API/file configuration in a more readable and validated format.
    - Displays key metadata fields and makes the underlying config field read-only for reference.
+   - Shows the cached column schema (read-only) and provides an "Infer schema" action that fetches the source
+     and stores its flattened columns and dtypes. The schema is used to validate TransformationStep configs.
 
 2. DataPresetAdmin
    - Standard model admin with slug prepopulation based on the name field.
+   - Additional sources (used by join/union steps) are picked with a horizontal filter widget.
+   - Every save records a PresetSnapshot of the preset (see utils/preset_io.py).
    - Displays ownership and timestamp fields for clarity and tracking.
 
 3. TransformationStepAdmin
@@ -24,6 +32,10 @@ Customizations include:
      with automatic validation and transformation-specific examples.
    - Adds filters and sorting by `step_type` and `preset` to allow easy categorization and management of workflows.
    - Makes the raw config read-only to prevent accidental edits outside the validated form.
+   - Adding, changing or deleting a step records a new PresetSnapshot of its preset.
+
+4. PresetSnapshotAdmin
+   - Read-only list of the saved versions of each preset, with a "Restore" action to roll a preset back.
 
 The goal of this setup is to provide a low-code backend environment where users can define data pipelines
 entirely through the Django admin, with clear structure, safety, and documentation built in.
@@ -33,13 +45,39 @@ entirely through the Django admin, with clear structure, safety, and documentati
 @admin.register(DataSource)
 class DataSourceAdmin(admin.ModelAdmin):
     form = DataSourceForm
-    list_display = ['name', 'source_type', 'owner', 'created']
-    readonly_fields = ['config']  
+    list_display = ['name', 'source_type', 'owner', 'created', 'schema_updated']
+    readonly_fields = ['config', 'schema', 'schema_updated']
+    actions = ['refresh_schema']
+
+    @admin.action(description="Infer schema from source")
+    def refresh_schema(self, request, queryset):
+        for source in queryset:
+            try:
+                df = fetch_source_data(source)
+            except Exception as e:
+                self.message_user(request, f'Could not fetch "{source.name}": {e}', messages.ERROR)
+                continue
+            source.schema = infer_schema(df)
+            source.schema_updated = timezone.now()
+            source.save(update_fields=['schema', 'schema_updated'])
+            self.message_user(request, f'Schema for "{source.name}" updated ({len(source.schema)} columns).')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Presets reading from this source include its config in their snapshots
+        for preset in (DataPreset.objects.filter(source=obj) | DataPreset.objects.filter(sources=obj)).distinct():
+            snapshot_preset(preset)
 
 @admin.register(DataPreset)
 class DataPresetAdmin(admin.ModelAdmin):
     list_display = ['name', 'user', 'created', 'updated']
     prepopulated_fields = {'slug': ('name',)}
+    filter_horizontal = ['sources']
+    readonly_fields = ['current_snapshot']
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        snapshot_preset(form.instance)
 
 @admin.register(TransformationStep)
 class TransformationStepAdmin(admin.ModelAdmin):
@@ -49,3 +87,39 @@ class TransformationStepAdmin(admin.ModelAdmin):
     ordering = ['preset__name', 'order']
     search_fields = ['preset__name', 'step_type']
     readonly_fields = ['config']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        snapshot_preset(obj.preset)
+
+    def delete_model(self, request, obj):
+        preset = obj.preset
+        super().delete_model(request, obj)
+        snapshot_preset(preset)
+
+    def delete_queryset(self, request, queryset):
+        presets = list(DataPreset.objects.filter(steps__in=queryset).distinct())
+        super().delete_queryset(request, queryset)
+        for preset in presets:
+            snapshot_preset(preset)
+
+@admin.register(PresetSnapshot)
+class PresetSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['preset', 'version', 'content_hash', 'created']
+    list_filter = ['preset']
+    readonly_fields = ['preset', 'version', 'content_hash', 'payload', 'created']
+    actions = ['restore']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Restore selected snapshot")
+    def restore(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one snapshot to restore.", messages.ERROR)
+            return
+        snapshot = restore_snapshot(queryset.get())
+        self.message_user(request, f'"{snapshot.preset.name}" is now at version {snapshot.version}.')
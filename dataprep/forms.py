@@ -1,6 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from .models import DataSource, DataPreset, TransformationStep
+from .utils.schema import source_columns, step_output_columns, validate_step
+from .utils.transform import step_config_error
 import json
 
 
@@ -19,8 +21,10 @@ is used to provide a more user-friendly text field with examples and validation.
 - Used in admin to create and manage transformation steps associated with a DataPreset.
 - Just like for DataSource, a `config_pretty` field is used instead of the raw `config` field.
 - The form also includes examples of how the configuration should look depending on the step type
-(e.g. to rename columns, remove columns, filter rows, etc.).
+(e.g. to rename columns, remove columns, filter rows, join another source, etc.).
 - JSON validation is done directly in the form to prevent input errors.
+- If the preset's DataSource has a known schema, the columns referenced by the config are checked
+against the columns available at that point in the preset (after all preceding steps).
 
 The purpose of these forms is to make it easier and safer for users (via admin) to create reusable data routines - without having to understand Django models or internal JSON handling.
 """
@@ -65,6 +69,7 @@ class DataSourceForm(forms.ModelForm):
 
 # ──────────────── TransformationStepForm ────────────────
 
+# Examples for different transformations
 STEP_CONFIG_EXAMPLES = {
     "rename_columns": {
         "mapping": {
@@ -89,34 +94,29 @@ STEP_CONFIG_EXAMPLES = {
     "add_columns": {
         "new_column": "total",
         "formula": "df['price'] * df['quantity']"
-    }
-}
-
-# Examples for different transformations
-STEP_CONFIG_EXAMPLES = {
-    "rename_columns": {
-        "mapping": {
-            "old_column": "new_column"
-        }
     },
-    "drop_columns": {
-        "columns": ["col1", "col2"]
+    "join": {
+        "source": "Users API",
+        "left_on": ["userId"],
+        "right_on": ["id"],
+        "how": "inner"
     },
-    "explode_column": {
-        "column": "tags"
+    "union": {
+        "source": "Archived Carts API"
     },
-    "filter_rows": {
-        "column": "status",
-        "condition": "==",
-        "value": "active"
-    },
-    "remove_duplicates": {
-        "subset": ["email"],
-        "keep": "first"
+    "group_by": {
+        "by": ["userId"],
+        "aggregations": {
+            "total_quantity": ["quantity", "sum"],
+            "products": ["id", "nunique"]
+        }
     },
-    "add_columns": {
-        "new_column": "total",
-        "formula": "df['price'] * df['quantity']"
+    "pivot": {
+        "index": ["userId"],
+        "columns": "category",
+        "values": "price",
+        "aggfunc": "sum",
+        "fill_value": 0
     }
 }
 
@@ -153,6 +153,51 @@ class TransformationStepForm(forms.ModelForm):
         except json.JSONDecodeError as e:
             raise ValidationError(f"Invalid JSON: {e}")
 
+    def clean(self):
+        cleaned_data = super().clean()
+        preset = cleaned_data.get('preset')
+        step_type = cleaned_data.get('step_type')
+        order = cleaned_data.get('order')
+        cfg = cleaned_data.get('config_pretty')
+
+        if not preset or not preset.source or not isinstance(cfg, dict) or order is None:
+            return cleaned_data
+
+        error = step_config_error(step_type, cfg)
+        if error:
+            self.add_error('config_pretty', ValidationError(error))
+            return cleaned_data
+
+        sources = {source.name: source for source in preset.sources.all()}
+        if step_type in ('join', 'union') and cfg['source'] not in sources:
+            self.add_error('config_pretty', ValidationError(
+                f"\"source\" must be one of the preset's additional sources: {', '.join(sources) or '(none selected)'}"
+            ))
+            return cleaned_data
+
+        columns = source_columns(preset.source)
+        if not columns:
+            return cleaned_data  # Schema not inferred yet, nothing to validate against
+
+        # Replay the preceding steps to get the columns available to this step
+        preceding = preset.steps.filter(order__lt=order).order_by('order')
+        if self.instance.pk:
+            preceding = preceding.exclude(pk=self.instance.pk)
+        for step in preceding:
+            if not isinstance(step.config, dict) or step_config_error(step.step_type, step.config):
+                return cleaned_data  # An earlier step is invalid, so its output columns are unknown
+            columns = step_output_columns(columns, step.step_type, step.config, sources)
+            if columns is None:
+                return cleaned_data  # Columns after a pivot depend on the data
+
+        missing = validate_step(columns, step_type, cfg, sources)
+        if missing:
+            self.add_error('config_pretty', ValidationError(
+                f"Unknown column(s) for source \"{preset.source.name}\": {', '.join(missing)}. "
+                f"Available at this step: {', '.join(columns)}"
+            ))
+        return cleaned_data
+
     def save(self, commit=True):
         self.instance.config = self.cleaned_data.get('config_pretty', {})
         return super().save(commit)
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from dataprep.models import DataPreset
+from dataprep.utils.preset_io import dump_preset
+
+
+class Command(BaseCommand):
+    help = "Exports presets (with their sources and steps) as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help="Preset slugs to export (default: all)")
+        parser.add_argument('--output', '-o', help="File to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        presets = DataPreset.objects.select_related('source').prefetch_related('sources', 'steps').order_by('name')
+        if options['slugs']:
+            presets = presets.filter(slug__in=options['slugs'])
+
+        data = json.dumps({"presets": [dump_preset(preset) for preset in presets]}, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
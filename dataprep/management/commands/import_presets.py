@@ -0,0 +1,31 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from dataprep.utils.preset_io import load_presets
+
+
+class Command(BaseCommand):
+    help = "Imports presets (with their sources and steps) from a JSON export, in a single transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON file created by export_presets")
+        parser.add_argument('--user', help="Username to own newly created presets and sources")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = get_user_model().objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                snapshots = load_presets(json.load(f), user=user)
+        except (OSError, json.JSONDecodeError, ValueError, KeyError, TypeError, IntegrityError) as e:
+            raise CommandError(f"Import failed: {e}")
+
+        for snapshot in snapshots:
+            self.stdout.write(f"{snapshot.preset.slug}: version {snapshot.version} ({snapshot.content_hash[:12]})")
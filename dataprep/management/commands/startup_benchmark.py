@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter per configuration, so that imports and RSS are measured from a cold start.
+CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns  # imports every view module, like the first request would
+booted = time.perf_counter()
+mode = sys.argv[1]
+if mode != "lazy":
+    from dataprep.warmup import warm_up
+    warm_up([] if mode == "imports" else None)
+ready = time.perf_counter()
+print(json.dumps({
+    "boot_ms": (booted - start) * 1000,
+    "warmup_ms": (ready - booted) * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "pandas_loaded": "pandas" in sys.modules,
+}))
+"""
+
+CONFIGURATIONS = {
+    "lazy": "No warm-up, pandas/requests load on the first run",
+    "imports": "Warm-up of pandas/requests only",
+    "warm": "Full warm-up incl. EASYDEED_WARMUP_PRESETS",
+}
+
+
+class Command(BaseCommand):
+    help = "Reports worker boot time and peak RSS for each warm-up configuration."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per configuration (the fastest is reported)")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'easydeed.settings'))
+        self.stdout.write(f"{'configuration':<10} {'boot ms':>9} {'warm-up ms':>11} {'total ms':>9} {'RSS MB':>8}  pandas")
+        for mode, description in CONFIGURATIONS.items():
+            runs = []
+            for _ in range(options['repeat']):
+                result = subprocess.run(
+                    [sys.executable, '-c', CHILD_SCRIPT, mode],
+                    cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            best = min(runs, key=lambda run: run['boot_ms'] + run['warmup_ms'])
+            self.stdout.write(
+                f"{mode:<10} {best['boot_ms']:9.1f} {best['warmup_ms']:11.1f} "
+                f"{best['boot_ms'] + best['warmup_ms']:9.1f} {best['rss_mb']:8.1f}  "
+                f"{'yes' if best['pandas_loaded'] else 'no':<6} ({description})"
+            )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from dataprep.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = "Imports pandas/requests and dry-runs the hot presets, reporting how long each part took."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'slugs', nargs='*',
+            help="Preset slugs to warm up (default: settings.EASYDEED_WARMUP_PRESETS)",
+        )
+
+    def handle(self, *args, **options):
+        timings = warm_up(options['slugs'] or None)
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name:<40} {seconds * 1000:8.1f} ms")
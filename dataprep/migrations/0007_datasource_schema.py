@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataprep', '0006_remove_datasource_slug_datapreset_slug'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datasource',
+            name='schema',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='datasource',
+            name='schema_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 18:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataprep', '0007_datasource_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActiveRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('started', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', 'key'], name='dataprep_ac_scope_c0e9e2_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=20)),
+                ('key', models.CharField(max_length=100)),
+                ('tokens', models.FloatField()),
+                ('refilled', models.FloatField()),
+            ],
+            options={
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
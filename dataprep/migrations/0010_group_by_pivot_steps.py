@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataprep', '0009_datapreset_sources'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transformationstep',
+            name='step_type',
+            field=models.CharField(choices=[('drop_columns', 'Drop Columns'), ('filter_rows', 'Filter Rows'), ('reorder_columns', 'Reorder Columns'), ('rename_columns', 'Rename Columns'), ('remove_duplicates', 'Remove Duplicates'), ('add_columns', 'Add Columns'), ('join', 'Join Source'), ('union', 'Union Source'), ('group_by', 'Group By / Aggregate'), ('pivot', 'Pivot')], max_length=100),
+        ),
+    ]
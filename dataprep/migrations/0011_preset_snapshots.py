@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataprep', '0010_group_by_pivot_steps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresetSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('payload', models.JSONField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('preset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='dataprep.datapreset')),
+            ],
+            options={
+                'ordering': ['preset', '-version'],
+                'unique_together': {('preset', 'content_hash'), ('preset', 'version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='datapreset',
+            name='current_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dataprep.presetsnapshot'),
+        ),
+    ]
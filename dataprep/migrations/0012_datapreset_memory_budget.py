@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataprep', '0011_preset_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datapreset',
+            name='memory_budget_mb',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
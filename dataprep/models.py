@@ -19,6 +19,8 @@ class DataSource(models.Model):
     owner = models.ForeignKey(User, on_delete=SET(get_eddy_user), null=True, blank=True)
     source_type = models.CharField(max_length=30, choices=SOURCE_TYPE)
     config = models.JSONField("API or file settings. The structure varies depending on the type.")
+    schema = models.JSONField(default=dict, blank=True) # Flattened column -> pandas dtype, inferred from the source. Example: {"userId": "int64", "title": "object"}
+    schema_updated = models.DateTimeField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -33,7 +35,10 @@ class DataPreset(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, max_length=100, blank=True, null=True)
     source = models.ForeignKey(DataSource, on_delete=models.SET_NULL, null=True, blank=True)
+    sources = models.ManyToManyField(DataSource, related_name='joined_presets', blank=True) # Additional sources combined with the main source by join/union steps
     description = models.TextField(blank=True)
+    memory_budget_mb = models.PositiveIntegerField(null=True, blank=True) # Lowers settings.EASYDEED_MEMORY_BUDGET_MB for this preset, see utils/memory.py
+    current_snapshot = models.ForeignKey('PresetSnapshot', on_delete=models.SET_NULL, null=True, blank=True, related_name='+') # Version currently in effect, see PresetSnapshot
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -58,6 +63,10 @@ STEP_TYPES = [
     ("rename_columns", "Rename Columns"),
     ("remove_duplicates", "Remove Duplicates"),
     ("add_columns", "Add Columns"),
+    ("join", "Join Source"),
+    ("union", "Union Source"),
+    ("group_by", "Group By / Aggregate"),
+    ("pivot", "Pivot"),
 ]
 
 class TransformationStep(models.Model):
@@ -67,4 +76,56 @@ class TransformationStep(models.Model):
     order = models.PositiveIntegerField() # Used to define the order in which the transformation steps should be applied
 
     def __str__(self):
-        return f'{self.order}: {self.step_type} in "{self.preset.name}"'
\ No newline at end of file
+        return f'{self.order}: {self.step_type} in "{self.preset.name}"'
+
+# PresetSnapshot - Immutable copy of a preset (source, additional sources and steps) as saved at one point in time.
+# Snapshots are identified by a SHA-256 hash of their content, so saving an unchanged preset or rolling back to an
+# earlier version reuses the existing snapshot instead of creating a new one. Results can be cached by content_hash.
+
+class PresetSnapshot(models.Model):
+    preset = models.ForeignKey(DataPreset, related_name='snapshots', on_delete=models.CASCADE)
+    version = models.PositiveIntegerField()
+    content_hash = models.CharField(max_length=64)
+    payload = models.JSONField() # Same format as the preset export, see utils/preset_io.py
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['preset', '-version']
+        unique_together = [('preset', 'version'), ('preset', 'content_hash')]
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            raise ValueError("Preset snapshots are immutable")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.preset.name} v{self.version} ({self.content_hash[:12]})'
+
+
+# Admission control for run_preset (see utils/throttle.py).
+# Each row is keyed by a scope ("source", "preset" or "user") and the id of the object in that scope.
+
+class RateLimitBucket(models.Model):
+    scope = models.CharField(max_length=20)
+    key = models.CharField(max_length=100)
+    tokens = models.FloatField() # Tokens left in the bucket after the last refill
+    refilled = models.FloatField() # Unix timestamp of the last refill
+
+    class Meta:
+        unique_together = [('scope', 'key')]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key} ({self.tokens:.2f} tokens)'
+
+
+class ActiveRun(models.Model):
+    scope = models.CharField(max_length=20)
+    key = models.CharField(max_length=100)
+    started = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField() # Slots of runs that crashed without releasing are reclaimed after this
+
+    class Meta:
+        indexes = [models.Index(fields=['scope', 'key'])]
+
+    def __str__(self):
+        return f'{self.scope}:{self.key} since {self.started.strftime("%H:%M:%S")}'
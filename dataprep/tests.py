@@ -1,3 +1,575 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+import weakref
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .forms import TransformationStepForm
+from .models import ActiveRun, DataPreset, DataSource, RateLimitBucket, TransformationStep
+from .utils import memory
+from .utils.data_import import fetch_source_data
+from .utils.memory import MemoryBudgetExceeded, SpilledFrame, frame_bytes
+from .utils.preset_io import REDACTED, dump_preset, load_presets, snapshot_preset
+from .utils.schema import SchemaDriftError, apply_schema
+from .utils.throttle import RateLimited, admit_run
+from .utils.transform import apply_step, run_source_steps, run_steps
+from .warmup import warm_up
+
+
+def make_source(schema, **config):
+    return DataSource.objects.create(
+        name=f"source-{DataSource.objects.count()}", source_type="api",
+        config=dict({"url": "https://example.com"}, **config), schema=schema,
+    )
+
+
+class FakeResponse:
+    """
+    Stand-in for requests.Response, returning a fixed JSON payload.
+    """
+
+    headers = {}
+
+    def __init__(self, data):
+        self.data = data
+        self.content = json.dumps(data).encode()
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class ApplySchemaTests(TestCase):
+
+    def test_lossy_casts_are_reported_as_drift(self):
+        source = make_source({"price": "int64", "active": "bool"})
+        df = pd.DataFrame({"price": [9.99, 1.0], "active": [True, "no"]})
+
+        with self.assertRaises(SchemaDriftError) as ctx:
+            apply_schema(df, source)
+
+        changes = {change["column"]: change for change in ctx.exception.dtype_changes}
+        self.assertEqual(set(changes), {"price", "active"})
+        self.assertEqual(changes["price"]["found"], "float64")
+
+    def test_lossless_casts_are_applied(self):
+        source = make_source({"id": "int64", "price": "float64", "note": "object", "flag": "bool", "active": "bool"})
+        df = pd.DataFrame({
+            "id": [1.0, None], "price": [1, 2], "note": [1, 2], "flag": [None, None], "active": [True, None],
+        })
+
+        df = apply_schema(df, source)
+
+        self.assertEqual(str(df["id"].dtype), "Int64")
+        self.assertEqual(df["id"].tolist()[0], 1)
+        self.assertEqual(str(df["price"].dtype), "float64")
+        self.assertEqual(str(df["note"].dtype), "object")
+        self.assertTrue(df["flag"].isna().all())
+        self.assertEqual(str(df["active"].dtype), "boolean")
+        self.assertTrue(df["active"][0])
+        self.assertTrue(pd.isna(df["active"][1]))
+
+    def test_missing_columns_are_reported(self):
+        source = make_source({"id": "int64"}, expected_columns=["title"])
+
+        with self.assertRaises(SchemaDriftError) as ctx:
+            apply_schema(pd.DataFrame({"other": [1]}), source)
+
+        self.assertEqual(ctx.exception.missing_columns, ["id", "title"])
+
+
+NO_LIMITS = {'source': {}, 'preset': {}, 'user': {}}
+
+
+@override_settings(EASYDEED_RATE_LIMIT_MAX_WAIT=0)
+class ThrottleTests(TestCase):
+
+    def setUp(self):
+        self.source = make_source({})
+        self.preset = DataPreset.objects.create(name="Throttled", source=self.source)
+
+    def admit(self, user_key="u1"):
+        return admit_run(self.preset, [self.source], user_key)
+
+    @override_settings(EASYDEED_RATE_LIMITS=dict(NO_LIMITS, preset={'rate': 1.0, 'burst': 2}))
+    def test_tokens_run_out_and_refill(self):
+        for _ in range(2):
+            with self.admit():
+                pass
+        with self.assertRaises(RateLimited) as ctx:
+            with self.admit():
+                pass
+        self.assertEqual((ctx.exception.scope, ctx.exception.retry_after), ("preset", 1))
+
+        RateLimitBucket.objects.filter(scope="preset").update(refilled=time.time() - 1.5)
+        with self.admit():
+            pass
+
+    @override_settings(EASYDEED_RATE_LIMITS=dict(NO_LIMITS, preset={'max_concurrent': 1}))
+    def test_slots_are_enforced_and_released(self):
+        with self.admit():
+            self.assertEqual(ActiveRun.objects.count(), 1)
+            with self.assertRaises(RateLimited):
+                with self.admit("u2"):
+                    pass
+
+        with self.assertRaises(ZeroDivisionError):
+            with self.admit():
+                1 / 0
+        self.assertEqual(ActiveRun.objects.count(), 0)
+
+    @override_settings(
+        EASYDEED_RATE_LIMITS=dict(NO_LIMITS, user={'rate': 0.01, 'burst': 1}),
+        EASYDEED_RATE_LIMIT_MAX_WAIT=200, EASYDEED_RATE_LIMIT_MAX_QUEUED=0,
+    )
+    def test_queue_is_bounded(self):
+        with self.admit():
+            pass
+        start = time.monotonic()
+        with self.assertRaisesMessage(RateLimited, "Too many queued requests"):
+            with self.admit():
+                pass
+        self.assertLess(time.monotonic() - start, 1)
+
+    @override_settings(EASYDEED_RATE_LIMITS=dict(NO_LIMITS, user={'rate': 1.0, 'burst': 2}))
+    def test_full_idle_user_buckets_are_pruned(self):
+        for user_key in ("ip:1", "ip:2", "ip:3"):
+            with self.admit(user_key):
+                pass
+        # ip:1 had time to refill, ip:2 did not, ip:3 has a run in progress
+        RateLimitBucket.objects.filter(scope="user", key="ip:1").update(refilled=time.time() - 3)
+        RateLimitBucket.objects.filter(scope="user", key="ip:3").update(refilled=time.time() - 3)
+        ActiveRun.objects.create(scope="user", key="ip:3", expires=timezone.now() + timedelta(minutes=1))
+
+        with self.admit("u1"):
+            pass
+
+        self.assertEqual(
+            set(RateLimitBucket.objects.filter(scope="user").values_list("key", flat=True)), {"ip:2", "ip:3", "u1"}
+        )
+
+    def test_locked_database_is_rate_limited(self):
+        with mock.patch("dataprep.utils.throttle._try_admit", side_effect=OperationalError("database is locked")):
+            with self.assertRaises(RateLimited):
+                with self.admit():
+                    pass
+        self.assertEqual(ActiveRun.objects.count(), 0)
+
+    @override_settings(EASYDEED_RATE_LIMITS=dict(NO_LIMITS, source={'rate': 0.1, 'burst': 1}))
+    @mock.patch("requests.request", return_value=FakeResponse([{"id": 1}]))
+    def test_view_returns_429_with_retry_after(self, request):
+        self.source.schema = {"id": "int64"}
+        self.source.save()
+        self.assertEqual(self.client.get("/presets/throttled/run/").status_code, 200)
+
+        response = self.client.get("/presets/throttled/run/")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "10")
+        self.assertEqual(response.json()["scope"], "source")
+        self.assertEqual(request.call_count, 1)
+
+
+class StepFormTests(TestCase):
+
+    def setUp(self):
+        self.source = make_source({"id": "int64", "title": "object"})
+        self.preset = DataPreset.objects.create(name="Steps", source=self.source)
+
+    def form(self, step_type, cfg, order=1):
+        return TransformationStepForm(data={
+            "preset": self.preset.pk, "step_type": step_type, "order": order, "config_pretty": json.dumps(cfg),
+        })
+
+    def test_wrongly_typed_fields_are_rejected(self):
+        for step_type, cfg in (
+            ("drop_columns", {"columns": 5}),
+            ("drop_columns", {"columns": "title"}),
+            ("rename_columns", {"mapping": ["title", "name"]}),
+            ("remove_duplicates", {"subset": {"id": True}}),
+            ("filter_rows", {"column": ["title"], "condition": "==", "value": 1}),
+        ):
+            form = self.form(step_type, cfg)
+            self.assertFalse(form.is_valid())
+            self.assertIn("must be", str(form.errors))
+
+    def test_invalid_earlier_step_does_not_break_validation(self):
+        TransformationStep.objects.create(preset=self.preset, step_type="rename_columns", order=1, config={"mapping": ["x"]})
+        form = self.form("drop_columns", {"columns": ["title"]}, order=2)
+        self.assertTrue(form.is_valid(), form.errors)
+
+
+class JoinValidationTests(TestCase):
+
+    def setUp(self):
+        self.carts = make_source({"id": "int64", "userId": "int64"})
+        self.users = make_source({"id": "int64", "firstName": "object"})
+        self.preset = DataPreset.objects.create(name="Joined", source=self.carts)
+        self.preset.sources.add(self.users)
+
+    def form(self, cfg):
+        return TransformationStepForm(data={
+            "preset": self.preset.pk, "step_type": "join", "order": 1, "config_pretty": json.dumps(cfg),
+        })
+
+    def test_valid_join(self):
+        form = self.form({"source": self.users.name, "left_on": "userId", "right_on": "id", "columns": ["firstName"]})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_invalid_join_type(self):
+        form = self.form({"source": self.users.name, "left_on": "userId", "right_on": "id", "how": "outer"})
+        self.assertIn("Unsupported join type", str(form.errors))
+
+    def test_source_must_be_a_name(self):
+        for source in ([self.users.name], {"name": self.users.name}):
+            form = self.form({"source": source, "on": "id"})
+            self.assertFalse(form.is_valid())
+            self.assertIn("needs the name", str(form.errors))
+
+    @override_settings(EASYDEED_RATE_LIMITS=NO_LIMITS)
+    @mock.patch("requests.request", return_value=FakeResponse([{"id": 1, "userId": 1, "firstName": "Ann"}]))
+    def test_source_list_at_run_time_is_a_400(self, request):
+        TransformationStep.objects.create(
+            preset=self.preset, step_type="union", order=1, config={"source": [self.users.name]},
+        )
+        response = self.client.get("/presets/joined/run/")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("is invalid", response.json()["error"])
+
+    def test_missing_keys(self):
+        self.assertIn("A join needs", str(self.form({"source": self.users.name}).errors))
+
+    def test_unknown_right_column(self):
+        form = self.form({"source": self.users.name, "left_on": "userId", "right_on": "id", "columns": ["lastName"]})
+        self.assertIn(f"{self.users.name}.lastName", str(form.errors))
+
+    @override_settings(EASYDEED_RATE_LIMITS=NO_LIMITS)
+    @mock.patch("requests.request", return_value=FakeResponse([{"id": 1, "userId": 1, "firstName": "Ann"}]))
+    def test_bad_join_at_run_time_is_a_400(self, request):
+        TransformationStep.objects.create(
+            preset=self.preset, step_type="join", order=1,
+            config={"source": self.users.name, "on": "id", "columns": ["lastName"]},
+        )
+        response = self.client.get("/presets/joined/run/")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Step failed", response.json()["error"])
+
+
+class GroupByTests(TestCase):
+
+    def setUp(self):
+        self.source = make_source({"userId": "int64", "title": "object"})
+        self.preset = DataPreset.objects.create(name="Grouped", source=self.source)
+
+    def form(self, cfg, step_type="group_by"):
+        return TransformationStepForm(data={
+            "preset": self.preset.pk, "step_type": step_type, "order": 1, "config_pretty": json.dumps(cfg),
+        })
+
+    def test_malformed_aggregations_are_rejected(self):
+        for aggregations in (["title", "count"], {"n": "title"}, {"n": ["title"]}, {"n": ["title", "count", "x"]}):
+            form = self.form({"by": "userId", "aggregations": aggregations})
+            self.assertFalse(form.is_valid())
+            self.assertIn("aggregations", str(form.errors))
+
+    def test_keys_must_be_column_names(self):
+        for by in (5, [5], {"userId": True}, []):
+            form = self.form({"by": by, "aggregations": {"n": ["title", "count"]}})
+            self.assertFalse(form.is_valid())
+            self.assertIn("A group_by needs", str(form.errors))
+        self.assertTrue(self.form({"by": ["userId"], "aggregations": {"n": ["title", "count"]}}).is_valid())
+
+    def test_pivot_fields_must_be_column_names(self):
+        for cfg in (
+            {"index": 5, "columns": "title", "values": "userId"},
+            {"index": "userId", "columns": {"title": 1}, "values": "userId"},
+            {"index": "userId", "columns": "title"},
+        ):
+            form = self.form(cfg, "pivot")
+            self.assertFalse(form.is_valid())
+            self.assertIn("A pivot needs", str(form.errors))
+
+    def test_unsupported_function_is_rejected(self):
+        form = self.form({"by": "userId", "aggregations": {"n": ["title", "median"]}})
+        self.assertIn("Unsupported aggregation", str(form.errors))
+
+    @override_settings(EASYDEED_RATE_LIMITS=NO_LIMITS)
+    @mock.patch("requests.request", return_value=FakeResponse([{"userId": 1, "title": "a"}]))
+    def test_mean_of_text_column_is_a_400(self, request):
+        TransformationStep.objects.create(
+            preset=self.preset, step_type="group_by", order=1,
+            config={"by": "userId", "aggregations": {"avg": ["title", "mean"]}},
+        )
+        response = self.client.get("/presets/grouped/run/")
+        self.assertEqual(response.status_code, 400)
+
+
+class WarmUpTests(TestCase):
+
+    def test_database_errors_do_not_stop_the_worker(self):
+        with mock.patch("dataprep.models.DataPreset.objects.filter", side_effect=OperationalError("no such table")):
+            with self.assertLogs("dataprep.warmup", "WARNING"):
+                timings = warm_up(["any"])
+        self.assertEqual(list(timings), ["imports"])
+
+    def test_failing_preset_is_logged(self):
+        source = make_source({"id": "int64"})
+        preset = DataPreset.objects.create(name="Warm", source=source)
+        TransformationStep.objects.create(
+            preset=preset, step_type="group_by", order=1, config={"by": "missing", "aggregations": {}},
+        )
+        with self.assertLogs("dataprep.warmup", "WARNING"):
+            timings = warm_up(["warm"])
+        self.assertIn("warm", timings)
+
+
+class PresetImportTests(TestCase):
+
+    def setUp(self):
+        self.carts = make_source({"id": "int64", "userId": "int64"})
+        self.users = make_source({"id": "int64", "firstName": "object"})
+
+    def preset(self, **data):
+        return dict({
+            "name": "Imported", "slug": "imported",
+            "source": {"name": self.carts.name, "config": self.carts.config},
+            "sources": [{"name": self.users.name, "config": self.users.config}],
+            "steps": [],
+        }, **data)
+
+    def test_malformed_input_is_rejected(self):
+        join = {"order": 1, "step_type": "join", "config": {"source": self.users.name, "on": "id", "how": "outer"}}
+        for data in (
+            ["not a preset"],
+            [self.preset(source="Carts")],
+            [self.preset(sources=[self.users.name])],
+            [self.preset(steps=[join])],
+            [self.preset(steps=[dict(join, config={"source": "Elsewhere", "on": "id"})])],
+            [self.preset(steps=[{"order": 1, "step_type": "group_by", "config": {"by": "id", "aggregations": ["x"]}}])],
+            [self.preset(steps=[{"order": 1, "step_type": "drop_columns", "config": {"columns": ["price"]}}])],
+        ):
+            with self.assertRaises(ValueError):
+                load_presets(data)
+        self.assertFalse(DataPreset.objects.exists())
+
+    def test_name_and_slug_conflicts_are_rejected(self):
+        DataPreset.objects.create(name="Taken", slug="taken")
+        # The name itself is taken, or the slug derived from it ("taken") is
+        for data in ({"name": "Taken", "slug": "other"}, {"name": "Taken!", "slug": None}):
+            with self.assertRaisesMessage(ValueError, "Another preset"):
+                load_presets([self.preset(**data)])
+        with self.assertRaisesMessage(CommandError, "Another preset"):
+            with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+                json.dump([self.preset(name="Taken", slug="other")], f)
+                f.flush()
+                call_command("import_presets", f.name)
+        self.assertEqual(DataPreset.objects.count(), 1)
+
+        # Presets are matched by slug, so this renames the existing one
+        load_presets([self.preset(name="Renamed", slug="taken")])
+        self.assertEqual(DataPreset.objects.get().name, "Renamed")
+
+    def test_import_view_reports_bad_input_as_400(self):
+        self.client.force_login(User.objects.create_user("staff", is_staff=True))
+        response = self.client.post(
+            "/presets/import/", json.dumps([self.preset(source="Carts")]), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_updating_a_source_snapshots_every_preset_using_it(self):
+        other = DataPreset.objects.create(name="Other", source=self.users)
+        before = snapshot_preset(other)
+
+        load_presets([self.preset(sources=[{"name": self.users.name, "config": {"url": "https://example.org"}}])])
+
+        other.refresh_from_db()
+        self.assertNotEqual(other.current_snapshot, before)
+        self.assertEqual(other.current_snapshot.payload["source"]["config"]["url"], "https://example.org")
+
+    def test_headers_are_redacted_and_kept_on_import(self):
+        self.carts.config = dict(self.carts.config, headers={"Authorization": "Bearer secret"})
+        self.carts.save()
+        preset = DataPreset.objects.create(name="Carts", source=self.carts)
+
+        exported = dump_preset(preset)
+        snapshot = snapshot_preset(preset)
+
+        self.assertEqual(exported["source"]["config"]["headers"], {"Authorization": REDACTED})
+        self.assertNotIn("secret", json.dumps(snapshot.payload))
+        load_presets([exported])
+        self.carts.refresh_from_db()
+        self.assertEqual(self.carts.config["headers"], {"Authorization": "Bearer secret"})
+        self.assertEqual(load_presets([exported])[0], snapshot)
+
+
+@override_settings(EASYDEED_RATE_LIMITS=NO_LIMITS)
+class MemoryBudgetViewTests(TestCase):
+
+    # 1000 records of about 18 bytes each in JSON, 2000 cells in the result
+    RECORDS = [{"a": 1, "b": 2}] * 1000
+
+    def setUp(self):
+        self.source = make_source({"a": "int64", "b": "int64"})
+        self.preset = DataPreset.objects.create(name="Budgeted", source=self.source)
+
+    def run_preset(self, budget):
+        with mock.patch("requests.request", return_value=FakeResponse(self.RECORDS)), \
+                mock.patch("dataprep.views.memory_budget", return_value=budget):
+            return self.client.get("/presets/budgeted/run/")
+
+    def test_result_within_budget(self):
+        self.assertEqual(self.run_preset(400_000).status_code, 200)
+
+    def test_sources_share_the_budget(self):
+        self.assertEqual(self.run_preset(300_000).status_code, 200)
+
+        self.preset.sources.add(make_source({"a": "int64", "b": "int64"}))
+        response = self.run_preset(300_000)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("share of the memory budget", response.json()["error"])
+
+    def test_oversized_result_is_not_serialized(self):
+        response = self.run_preset(250_000)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("too large to return", response.json()["error"])
+
+
+def make_step(order, step_type, **config):
+    return TransformationStep(order=order, step_type=step_type, config=config)
+
+
+class SpillTests(TestCase):
+
+    BUDGET = 100_000
+
+    def setUp(self):
+        # Spill into a directory of our own, to check that nothing is left behind
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        patcher = mock.patch.object(tempfile, "tempdir", self.tmp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        n = 20_000
+        self.df = pd.DataFrame({"k": [i % 7 for i in range(n)], "v": range(n), "x": [i / 3 for i in range(n)]})
+        self.frames = {
+            "users": pd.DataFrame({"id": range(7), "name": [f"user {i}" for i in range(7)]}),
+            "archive": pd.DataFrame({"k": [0] * 100, "v": [1] * 100, "x": [0.5] * 100}),
+        }
+
+    def compare(self, steps):
+        expected = run_steps(self.df, steps, self.frames)
+        with mock.patch.object(SpilledFrame, "from_frame", wraps=SpilledFrame.from_frame) as spill:
+            result = run_steps(self.df, steps, self.frames, self.BUDGET)
+        self.assertTrue(spill.called)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+        by = list(expected.columns[:1])
+        pd.testing.assert_frame_equal(
+            result.sort_values(by).reset_index(drop=True), expected.sort_values(by).reset_index(drop=True),
+            check_dtype=False,
+        )
+
+    def test_group_by_in_chunks_matches_in_memory(self):
+        self.compare([make_step(1, "group_by", by="k", aggregations={
+            "total": ["v", "sum"], "avg": ["x", "mean"], "n": ["v", "count"], "lo": ["v", "min"], "hi": ["x", "max"],
+        })])
+        self.compare([make_step(1, "group_by", by=["k"])])
+
+    def test_row_steps_join_and_union_in_chunks_match_in_memory(self):
+        self.compare([
+            make_step(1, "union", source="archive"),
+            make_step(2, "rename_columns", mapping={"k": "userId"}),
+            make_step(3, "join", source="users", left_on="userId", right_on="id", how="left"),
+            make_step(4, "drop_columns", columns=["x"]),
+            make_step(5, "group_by", by="name", aggregations={"total": ["v", "sum"], "avg": ["v", "mean"]}),
+        ])
+
+    def test_spilled_source_frame_is_released(self):
+        frames = dict(self.frames, carts=self.df.copy())
+        source_frame = weakref.ref(frames["carts"])
+        alive = []
+
+        def spy(*args):
+            alive.append(source_frame() is not None)
+            return apply_step(*args)
+
+        steps = [
+            make_step(1, "drop_columns", columns=["x"]),
+            make_step(2, "group_by", by="k", aggregations={"total": ["v", "sum"]}),
+        ]
+        with mock.patch("dataprep.utils.transform.apply_step", side_effect=spy):
+            result = run_source_steps(frames, "carts", steps, self.BUDGET)
+
+        self.assertTrue(alive)
+        self.assertFalse(any(alive))
+        self.assertEqual(frames, {})  # Neither "users" nor "archive" is used by a step
+        self.assertEqual(result["total"].sum(), self.df["v"].sum())
+
+    def test_step_needing_all_rows_is_a_413(self):
+        steps = [make_step(1, "pivot", index="k", columns="v", values="x")]
+        with self.assertRaisesMessage(MemoryBudgetExceeded, "needs all 20000 rows in memory"):
+            run_steps(self.df, steps, self.frames, self.BUDGET)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_oversized_result_is_a_413(self):
+        with self.assertRaisesMessage(MemoryBudgetExceeded, "does not fit the memory budget"):
+            run_steps(self.df, [make_step(1, "drop_columns", columns=["x"])], self.frames, self.BUDGET)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_temp_files_are_removed_on_error(self):
+        steps = [make_step(1, "group_by", by="missing", aggregations={"n": ["v", "count"]})]
+        with self.assertRaises(KeyError):
+            run_steps(self.df, steps, self.frames, self.BUDGET)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_chunks_fall_back_to_pickle(self):
+        with mock.patch.object(memory, "PARQUET_AVAILABLE", False), SpilledFrame.from_frame(self.df, self.BUDGET) as spilled:
+            self.assertTrue(all(name.endswith(".pkl") for name in os.listdir(spilled._dir.name)))
+            self.assertGreater(len(os.listdir(spilled._dir.name)), 1)
+            pd.testing.assert_frame_equal(spilled.to_frame(2 * frame_bytes(self.df)), self.df)
+
+        with mock.patch.object(memory, "PARQUET_AVAILABLE", True), \
+                mock.patch.object(pd.DataFrame, "to_parquet", side_effect=ValueError("mixed types")), \
+                SpilledFrame.from_frame(self.df, self.BUDGET) as spilled:
+            self.assertTrue(all(name.endswith(".pkl") for name in os.listdir(spilled._dir.name)))
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    @skipUnless(memory.PARQUET_AVAILABLE, "pyarrow is not installed")
+    def test_chunks_are_stored_as_parquet(self):
+        with SpilledFrame.from_frame(self.df, self.BUDGET) as spilled:
+            self.assertTrue(all(name.endswith(".parquet") for name in os.listdir(spilled._dir.name)))
+            pd.testing.assert_frame_equal(spilled.to_frame(2 * frame_bytes(self.df)), self.df)
+
+    def test_content_length_is_checked_before_reading(self):
+        response = FakeResponse([{"a": 1}])
+        response.headers = {"Content-Length": str(10 * self.BUDGET)}
+        response.iter_content = mock.Mock()
+        with mock.patch("requests.request", return_value=response):
+            with self.assertRaises(MemoryBudgetExceeded):
+                fetch_source_data(make_source({}), self.BUDGET)
+        response.iter_content.assert_not_called()
@@ -2,5 +2,7 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('presets/<slug:slug>/run/', views.run_preset, name="run_preset")
+    path('presets/export/', views.export_presets, name="export_presets"),
+    path('presets/import/', views.import_presets, name="import_presets"),
+    path('presets/<slug:slug>/run/', views.run_preset, name="run_preset"),
 ]
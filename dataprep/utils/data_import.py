@@ -1,4 +1,11 @@
-import pandas as pd
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .memory import JSON_INFLATION, MB, MemoryBudgetExceeded
+
+# pandas and requests are imported inside the functions below, so that workers only pay for
+# them on the first preset run (or during warm-up, see dataprep/warmup.py).
+
 
 def extract_flat_dataframe(data, root_key=None, record_path=None, meta_fields=None):
     """
@@ -12,6 +19,8 @@ API example - https://dummyjson.com/carts
 
 Uses pandas.json_normalize() to create a flattened structure.
     """
+    import pandas as pd
+
     if root_key and isinstance(data, dict):
         data = data.get(root_key, [])
 
@@ -27,3 +36,76 @@ Uses pandas.json_normalize() to create a flattened structure.
         )
     else:
         return pd.json_normalize(data, sep="__") if isinstance(data, (list, dict)) else pd.DataFrame()
+
+
+def fetch_source_data(source, max_bytes=None):
+    """
+Fetches and flattens the data for a DataSource into a DataFrame.
+
+Reads url, method, headers, params, root_key, record_path and meta_fields from source.config
+(see JSON Templates/api.json). Only API sources are supported; other types raise ValueError.
+HTTP errors are raised as requests exceptions and are left to the caller to report.
+
+With max_bytes (this source's share of the run's memory budget, see fetch_sources), the response body
+is streamed and the fetch is aborted with MemoryBudgetExceeded as soon as it grows beyond
+max_bytes / JSON_INFLATION, leaving room for parsing and flattening it.
+    """
+    import requests
+
+    if source.source_type != "api":
+        raise ValueError("Unsupported source type")
+
+    config = source.config
+    url = config.get("url")
+    method = config.get("method", "GET").upper()
+    headers = config.get("headers", {})
+    params = config.get("params", {})
+
+    if max_bytes is None:
+        response = requests.request(method, url, headers=headers, params=params)
+        response.raise_for_status()
+        data = response.json()
+    else:
+        with requests.request(method, url, headers=headers, params=params, stream=True) as response:
+            response.raise_for_status()
+            data = json.loads(_read_limited(response, max_bytes // JSON_INFLATION, source))
+
+    return extract_flat_dataframe(
+        data,
+        config.get("root_key"),
+        config.get("record_path"),
+        config.get("meta_fields"),
+    )
+
+
+def _read_limited(response, max_bytes, source):
+    too_large = (
+        f'Response from "{source.name}" is larger than {max_bytes / MB:.1f} MB, the most its share of the '
+        f'memory budget can parse'
+    )
+    budget = max_bytes * JSON_INFLATION
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit() and int(length) > max_bytes:
+        raise MemoryBudgetExceeded(too_large, budget, int(length) * JSON_INFLATION)
+
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        body += chunk
+        if len(body) > max_bytes:
+            raise MemoryBudgetExceeded(too_large, budget)
+    return bytes(body)
+
+
+def fetch_sources(sources, budget=None):
+    """
+Fetches several DataSources in parallel (one thread per source) and returns {source.name: DataFrame}.
+The first error raised by any fetch is re-raised.
+
+With a budget (the run's memory budget in bytes), the fetches run at the same time, so each gets an
+equal share of it.
+    """
+    sources = list(sources)
+    share = budget // max(1, len(sources)) if budget is not None else None
+    with ThreadPoolExecutor(max_workers=max(1, len(sources))) as executor:
+        frames = list(executor.map(lambda source: fetch_source_data(source, share), sources))
+    return {source.name: df for source, df in zip(sources, frames)}
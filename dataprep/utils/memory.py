@@ -0,0 +1,150 @@
+import importlib.util
+import os
+import tempfile
+
+from django.conf import settings
+
+"""
+memory.py – Memory budget for preset runs and spill-to-disk storage for DataFrames that exceed it.
+
+The budget of a run is settings.EASYDEED_MEMORY_BUDGET_MB, lowered by DataPreset.memory_budget_mb if set.
+It is enforced in two places:
+
+1. While fetching (utils/data_import.py): the budget is shared by all sources of the run. Parsing and
+   flattening JSON takes about JSON_INFLATION times the size of the response body, so each response is
+   limited to its share of the budget divided by JSON_INFLATION, and is not read any further beyond that.
+2. Between steps (utils/transform.py): the estimated size of the working DataFrame is checked after every
+   step. When it exceeds the budget, the frame is written to a SpilledFrame (row chunks in a temporary
+   directory) and the following steps run chunk by chunk, as far as they can. Steps that need all rows at
+   once, and the final result, are brought back into memory only if they fit the budget.
+3. Before responding (views.py): turning the result into JSON records needs far more memory than the
+   DataFrame itself (see result_bytes), so results whose estimate exceeds the budget are not serialized.
+
+Work that cannot fit raises MemoryBudgetExceeded, which run_preset reports as a 413 response.
+Chunks are stored as Parquet files when pyarrow is installed, otherwise as pickles.
+"""
+
+MB = 1024 * 1024
+
+# Fraction of the budget a single chunk may use, leaving room for the step applied to it
+CHUNK_FRACTION = 0.25
+
+# Peak memory of parsing and flattening a JSON response, relative to the size of its body
+JSON_INFLATION = 10
+
+# Memory per cell of a result while it is turned into JSON records and encoded (measured 100-160 bytes)
+RESULT_CELL_BYTES = 128
+
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+class MemoryBudgetExceeded(Exception):
+    """
+    Raised when a run needs more memory than its budget allows.
+    """
+
+    def __init__(self, message, budget, needed=None):
+        self.budget = budget
+        self.needed = needed
+        super().__init__(message)
+
+    def to_dict(self):
+        data = {"error": str(self), "budget_mb": round(self.budget / MB, 1)}
+        if self.needed is not None:
+            data["needed_mb"] = round(self.needed / MB, 1)
+        return data
+
+
+def memory_budget(preset):
+    """
+    Returns the memory budget of a run in bytes, or None if no budget is configured.
+    """
+    budgets = [mb for mb in (settings.EASYDEED_MEMORY_BUDGET_MB, preset.memory_budget_mb) if mb]
+    return min(budgets) * MB if budgets else None
+
+
+def frame_bytes(df):
+    """
+    Estimated in-memory size of a DataFrame, including the contents of object columns.
+    """
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def result_bytes(df):
+    """
+    Estimated peak memory of returning df as a JSON response: the frame, its records and the encoded body.
+    """
+    return frame_bytes(df) + df.size * RESULT_CELL_BYTES
+
+
+class SpilledFrame:
+    """
+    A DataFrame stored on disk as a sequence of row chunks. Always close() it (or use it as a
+    context manager) to remove the temporary files.
+    """
+
+    def __init__(self):
+        self._dir = tempfile.TemporaryDirectory(prefix="easydeed-spill-")
+        self._paths = []
+        self.bytes = 0
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @classmethod
+    def from_frame(cls, df, budget):
+        """
+        Splits df into chunks of at most CHUNK_FRACTION of the budget and writes them to disk.
+        """
+        spilled = cls()
+        chunk_rows = max(1, int(len(df) * budget * CHUNK_FRACTION / max(frame_bytes(df), 1)))
+        for start in range(0, len(df), chunk_rows):
+            spilled.append(df.iloc[start:start + chunk_rows])
+        return spilled
+
+    def append(self, df):
+        path = os.path.join(self._dir.name, f"{len(self._paths):06d}")
+        self._paths.append(_write_chunk(df, path))
+        self.bytes += frame_bytes(df)
+        self.rows += len(df)
+
+    def chunks(self):
+        import pandas as pd
+
+        for path in self._paths:
+            yield pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+    def to_frame(self, budget):
+        """
+        Loads all chunks back into a single DataFrame, if it fits the budget.
+        """
+        import pandas as pd
+
+        if self.bytes > budget:
+            raise MemoryBudgetExceeded(
+                f"The data ({self.bytes / MB:.1f} MB) does not fit the memory budget ({budget / MB:.1f} MB)",
+                budget, self.bytes,
+            )
+        frames = list(self.chunks())
+        return pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+
+    def close(self):
+        self._dir.cleanup()
+
+
+def _write_chunk(df, path):
+    """
+    Writes a chunk as Parquet if possible, otherwise as a pickle. Returns the path written.
+    """
+    if PARQUET_AVAILABLE:
+        try:
+            df.to_parquet(path + ".parquet")
+            return path + ".parquet"
+        except (TypeError, ValueError, NotImplementedError):
+            pass  # e.g. object columns mixing types, which Parquet cannot store
+    df.to_pickle(path + ".pkl")
+    return path + ".pkl"
@@ -0,0 +1,247 @@
+import hashlib
+import json
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from ..models import STEP_TYPES, DataPreset, DataSource, PresetSnapshot, TransformationStep
+from .schema import source_columns, step_output_columns, validate_step
+from .transform import step_config_error
+
+"""
+preset_io.py – Bulk import/export of whole presets and versioned preset snapshots.
+
+A preset is exported as a single JSON object containing everything needed to recreate it:
+
+{
+  "name": "Cart totals",
+  "slug": "cart-totals",
+  "description": "",
+  "memory_budget_mb": null,
+  "source": {"name": "Carts API", "source_type": "api", "config": {...}},
+  "sources": [{"name": "Users API", "source_type": "api", "config": {...}}],
+  "steps": [{"order": 1, "step_type": "group_by", "config": {...}}]
+}
+
+load_presets() creates or updates presets from a list of such objects in a single transaction. Sources are
+matched by name and presets by slug; the steps of an imported preset replace its existing steps and are
+written with bulk_create. The input is validated like the admin forms validate a single step (structure of
+every step, join/union sources, and columns against cached schemas); on any error nothing is written.
+
+Header values of source configs (API tokens) are never exported or stored in snapshots: they are replaced
+by "<redacted>", and importing a redacted header keeps the value the existing source already has.
+
+Every saved version of a preset is recorded as an immutable PresetSnapshot holding this same JSON, keyed by
+its content hash. The snapshot in effect is stored on DataPreset.current_snapshot, so results can be keyed
+by version, and restoring an earlier snapshot brings back its original hash instead of creating a new one.
+"""
+
+STEP_TYPE_VALUES = {value for value, label in STEP_TYPES}
+
+# Exported in place of header values, which usually hold API tokens
+REDACTED = "<redacted>"
+
+
+def redact_config(config):
+    """
+    Returns a copy of a source config with the values of its `headers` replaced by REDACTED.
+    """
+    if not isinstance(config.get("headers"), dict) or not config["headers"]:
+        return config
+    return dict(config, headers={name: REDACTED for name in config["headers"]})
+
+
+def _unredact_config(config, current):
+    """
+    Puts back the current values of headers that were exported as REDACTED. Redacted headers the source
+    does not have yet are left out, so they have to be filled in through the admin.
+    """
+    headers = config.get("headers")
+    if not isinstance(headers, dict) or REDACTED not in headers.values():
+        return config
+    current_headers = current.get("headers") or {}
+    return dict(config, headers={
+        name: current_headers[name] if value == REDACTED else value
+        for name, value in headers.items()
+        if value != REDACTED or name in current_headers
+    })
+
+
+def dump_source(source):
+    return {"name": source.name, "source_type": source.source_type, "config": redact_config(source.config)}
+
+
+def dump_preset(preset):
+    """
+    Returns the JSON-serializable export of a preset, including its sources and steps.
+    """
+    return {
+        "name": preset.name,
+        "slug": preset.slug,
+        "description": preset.description,
+        "memory_budget_mb": preset.memory_budget_mb,
+        "source": dump_source(preset.source) if preset.source else None,
+        "sources": [dump_source(source) for source in preset.sources.order_by("name")],
+        "steps": [
+            {"order": step.order, "step_type": step.step_type, "config": step.config}
+            for step in preset.steps.order_by("order", "pk")
+        ],
+    }
+
+
+def content_hash(payload):
+    """
+    SHA-256 of the canonical JSON form of a payload (sorted keys, no whitespace).
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def snapshot_preset(preset):
+    """
+    Records the current state of a preset as a snapshot and marks it as the version in effect.
+    Returns the existing snapshot if one with the same content already exists.
+    """
+    payload = dump_preset(preset)
+    digest = content_hash(payload)
+
+    with transaction.atomic():
+        snapshot = PresetSnapshot.objects.filter(preset=preset, content_hash=digest).first()
+        if snapshot is None:
+            last = preset.snapshots.order_by("-version").values_list("version", flat=True).first() or 0
+            snapshot = PresetSnapshot.objects.create(
+                preset=preset, version=last + 1, content_hash=digest, payload=payload
+            )
+        if preset.current_snapshot_id != snapshot.pk:
+            preset.current_snapshot = snapshot
+            preset.save(update_fields=["current_snapshot", "updated"])
+    return snapshot
+
+
+def _load_source(data, owner, update=True):
+    current = DataSource.objects.filter(name=data["name"]).first()
+    config = _unredact_config(data.get("config", {}), current.config if current else {})
+    defaults = {"source_type": data.get("source_type", "api"), "config": config}
+    if not update:
+        source, _ = DataSource.objects.get_or_create(name=data["name"], defaults=dict(defaults, owner=owner))
+        return source
+    source, _ = DataSource.objects.update_or_create(
+        name=data["name"], defaults=defaults, create_defaults=dict(defaults, owner=owner)
+    )
+    return source
+
+
+def _is_source(data):
+    return isinstance(data, dict) and isinstance(data.get("name"), str) and data["name"] \
+        and isinstance(data.get("config", {}), dict)
+
+
+def _validate(data):
+    """
+    Checks the structure of one exported preset and of its steps, like TransformationStepForm does for a
+    single step. Raises ValueError describing the first problem found.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("name"), str) or not data["name"]:
+        raise ValueError("Every preset needs to be an object with a name")
+    name = data["name"]
+    sources = data.get("sources", [])
+    if data.get("source") is not None and not _is_source(data["source"]):
+        raise ValueError(f'"source" of preset "{name}" must be an object with a "name" and a "config" object')
+    if not isinstance(sources, list) or not all(_is_source(source) for source in sources):
+        raise ValueError(f'"sources" of preset "{name}" must be a list of objects with a "name" and a "config" object')
+    if not isinstance(data.get("steps", []), list):
+        raise ValueError(f'"steps" of preset "{name}" must be a list')
+
+    source_names = {source["name"] for source in sources}
+    for step in data.get("steps", []):
+        if not isinstance(step, dict) or step.get("step_type") not in STEP_TYPE_VALUES:
+            step_type = step.get("step_type") if isinstance(step, dict) else step
+            raise ValueError(f'Unknown step type "{step_type}" in preset "{name}"')
+        cfg = step.get("config", {})
+        if not isinstance(cfg, dict) or not isinstance(step.get("order"), int):
+            raise ValueError(f'Each step of preset "{name}" needs an integer "order" and a "config" object')
+        error = step_config_error(step["step_type"], cfg)
+        if not error and step["step_type"] in ("join", "union") and cfg["source"] not in source_names:
+            error = f'"source" must be one of the preset\'s additional sources: {", ".join(sorted(source_names)) or "(none)"}'
+        if error:
+            raise ValueError(f'Step {step["order"]} of preset "{name}": {error}')
+
+
+def _check_columns(preset, steps):
+    """
+    Raises ValueError if a step refers to columns that are not available at that point of the preset,
+    going by the cached schemas of its sources. Presets without a cached schema are not checked.
+    """
+    columns = source_columns(preset.source) if preset.source else []
+    if not columns:
+        return
+    sources = {source.name: source for source in preset.sources.all()}
+    for step in sorted(steps, key=lambda step: step.order):
+        missing = validate_step(columns, step.step_type, step.config, sources)
+        if missing:
+            raise ValueError(
+                f'Step {step.order} of preset "{preset.name}" refers to unknown column(s): {", ".join(missing)}'
+            )
+        columns = step_output_columns(columns, step.step_type, step.config, sources)
+        if columns is None:
+            return  # Columns after a pivot depend on the data
+
+
+def load_presets(presets, user=None, update_sources=True):
+    """
+    Creates or updates presets (with their sources and steps) from exported JSON, all in one transaction.
+    With update_sources=False, existing sources keep their current config and only missing ones are created.
+    Other presets reading from an updated source get a new snapshot too, since their snapshots include its config.
+    Raises ValueError for invalid input, in which case nothing is written. Returns the list of snapshots.
+    """
+    if isinstance(presets, dict):
+        presets = presets.get("presets", [presets])
+    if not isinstance(presets, list):
+        raise ValueError('Expected a preset, a list of presets or {"presets": [...]}')
+    for data in presets:
+        _validate(data)
+
+    snapshots = []
+    loaded_sources = set()
+    with transaction.atomic():
+        for data in presets:
+            lookup = {"slug": data["slug"]} if data.get("slug") else {"name": data["name"]}
+            preset = DataPreset.objects.filter(**lookup).first() or DataPreset(user=user, **lookup)
+            others = DataPreset.objects.exclude(pk=preset.pk)
+            if others.filter(name=data["name"]).exists():
+                raise ValueError(f'Another preset is already named "{data["name"]}"')
+            if others.filter(slug=preset.slug or slugify(data["name"])).exists():
+                raise ValueError(f'Another preset already has the slug "{preset.slug or slugify(data["name"])}"')
+            preset.name = data["name"]
+            preset.description = data.get("description", "")
+            preset.memory_budget_mb = data.get("memory_budget_mb")
+            preset.source = _load_source(data["source"], user, update_sources) if data.get("source") else None
+            preset.save()
+
+            sources = [_load_source(source, user, update_sources) for source in data.get("sources", [])]
+            preset.sources.set(sources)
+            loaded_sources.update(source.pk for source in sources + [preset.source] if source)
+            preset.steps.all().delete()
+            steps = TransformationStep.objects.bulk_create(
+                TransformationStep(preset=preset, order=step["order"], step_type=step["step_type"], config=step.get("config", {}))
+                for step in data.get("steps", [])
+            )
+            _check_columns(preset, steps)
+            snapshots.append(snapshot_preset(preset))
+
+        if update_sources and loaded_sources:
+            imported = [snapshot.preset_id for snapshot in snapshots]
+            others = DataPreset.objects.filter(Q(source__in=loaded_sources) | Q(sources__in=loaded_sources))
+            for preset in others.exclude(pk__in=imported).distinct():
+                snapshot_preset(preset)
+    return snapshots
+
+
+def restore_snapshot(snapshot):
+    """
+    Rolls a preset back to the steps and sources of a snapshot. Source configs are left as they are (they may
+    hold rotated API tokens); if they are unchanged, the snapshot becomes the version in effect again.
+    """
+    payload = dict(snapshot.payload, slug=snapshot.preset.slug)
+    return load_presets([payload], user=snapshot.preset.user, update_sources=False)[0]
@@ -0,0 +1,250 @@
+import re
+
+"""
+schema.py – Column schema inference and validation for DataSources and TransformationSteps.
+
+A DataSource stores its flattened column schema in `DataSource.schema` as a mapping of
+column name -> pandas dtype (e.g. {"userId": "int64", "title": "object"}).
+
+The schema is used in two places:
+
+1. At save time (TransformationStepForm)
+   - The columns available to a step are derived from the source schema by replaying all
+     preceding steps of the preset (renames, drops, added columns, ...).
+   - Any column referenced by the step config that is not available is reported as a validation error.
+
+2. At run time (run_preset)
+   - The flattened DataFrame is checked against the cached schema (and `expected_columns`, see
+     JSON Templates/file.json). Missing columns or values that no longer fit the cached dtype are
+     raised as a SchemaDriftError, which the view reports as a structured JSON error.
+   - Columns are cast to the cached dtypes once, so every step sees the same types on every run.
+"""
+
+# Matches column references in add_columns formulas, e.g. df['price'] or df["quantity"]
+FORMULA_COLUMN_RE = re.compile(r"df\[\s*['\"](.+?)['\"]\s*\]")
+
+
+class SchemaDriftError(Exception):
+    """
+    Raised when the data returned by a DataSource no longer matches its cached schema.
+    """
+
+    def __init__(self, source, missing_columns=None, dtype_changes=None):
+        self.source = source
+        self.missing_columns = missing_columns or []
+        self.dtype_changes = dtype_changes or []
+        super().__init__(f'Schema drift detected for source "{source.name}"')
+
+    def to_dict(self):
+        return {
+            "error": str(self),
+            "source": self.source.name,
+            "missing_columns": self.missing_columns,
+            "dtype_changes": self.dtype_changes,
+        }
+
+
+def infer_schema(df):
+    """
+    Returns the flattened column schema of a DataFrame as {column: dtype}.
+    """
+    return {str(column): str(dtype) for column, dtype in df.dtypes.items()}
+
+
+def empty_frame(schema):
+    """
+    Returns an empty DataFrame with the columns and dtypes of a cached schema.
+    """
+    import pandas as pd
+
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schema.items()})
+
+
+def source_columns(source):
+    """
+    Returns the columns known for a DataSource: the cached schema followed by any
+    `expected_columns` from the config that are not part of it.
+    """
+    columns = list(source.schema or {})
+    for column in source.config.get("expected_columns", []):
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def _as_list(value):
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def join_keys(cfg):
+    """
+    Returns the (left, right) key column lists of a join config, from `on` or `left_on`/`right_on`.
+    """
+    return _as_list(cfg.get("left_on") or cfg.get("on")), _as_list(cfg.get("right_on") or cfg.get("on"))
+
+
+def join_config_error(cfg):
+    """
+    Returns a description of what is wrong with a join config, or None if it is usable.
+    """
+    left_on, right_on = join_keys(cfg)
+    if not left_on or len(left_on) != len(right_on):
+        return 'A join needs "on", or "left_on" and "right_on" with the same number of columns'
+    if cfg.get("how", "inner") not in ("inner", "left"):
+        return f'Unsupported join type "{cfg.get("how")}", use "inner" or "left"'
+    if not isinstance(cfg.get("columns", []), list):
+        return '"columns" must be a list of column names'
+    return None
+
+
+def step_input_columns(step_type, cfg):
+    """
+    Returns the columns a step configuration refers to.
+    """
+    if step_type == "rename_columns":
+        return list(cfg.get("mapping", {}))
+    if step_type in ("drop_columns", "reorder_columns"):
+        return list(cfg.get("columns", []))
+    if step_type in ("explode_column", "filter_rows"):
+        return [cfg["column"]] if cfg.get("column") else []
+    if step_type == "remove_duplicates":
+        return list(cfg.get("subset") or [])
+    if step_type == "add_columns":
+        return FORMULA_COLUMN_RE.findall(cfg.get("formula", ""))
+    if step_type == "join":
+        return join_keys(cfg)[0]
+    if step_type == "group_by":
+        return _as_list(cfg.get("by")) + [spec[0] for spec in cfg.get("aggregations", {}).values() if spec]
+    if step_type == "pivot":
+        return _as_list(cfg.get("index")) + _as_list(cfg.get("columns")) + _as_list(cfg.get("values"))
+    return []
+
+
+def step_output_columns(columns, step_type, cfg, sources=None):
+    """
+    Returns the columns available after applying a step to `columns`, or None if they depend on
+    the data itself (pivot). `sources` maps DataSource names to DataSources, used by join and union steps.
+    """
+    if step_type == "group_by":
+        return _as_list(cfg.get("by")) + (list(cfg.get("aggregations") or {}) or ["count"])
+    if step_type == "pivot":
+        return None
+    if step_type in ("join", "union"):
+        source = (sources or {}).get(cfg.get("source"))
+        other = source_columns(source) if source else []
+        if step_type == "union":
+            return columns + [column for column in other if column not in columns]
+        left_on, right_on = join_keys(cfg)
+        if cfg.get("columns"):
+            other = [column for column in other if column in cfg["columns"] or column in right_on]
+        suffix = cfg.get("suffix", "__right")
+        joined = list(columns)
+        for column in other:
+            if column in left_on and column in right_on:
+                continue
+            if column in right_on and column not in columns:
+                continue  # Differently named right-side keys are dropped after the join
+            joined.append(f"{column}{suffix}" if column in columns else column)
+        return joined
+    if step_type == "rename_columns":
+        mapping = cfg.get("mapping", {})
+        return [mapping.get(column, column) for column in columns]
+    if step_type == "drop_columns":
+        dropped = set(cfg.get("columns", []))
+        return [column for column in columns if column not in dropped]
+    if step_type == "add_columns":
+        new_column = cfg.get("new_column")
+        if new_column and new_column not in columns:
+            return columns + [new_column]
+    return list(columns)
+
+
+def validate_step(columns, step_type, cfg, sources=None):
+    """
+    Returns the columns referenced by the step that are not in `columns`. For joins, the right-side
+    keys and `columns` are also checked against the schema of the joined source, if it is known.
+    """
+    available = set(columns)
+    missing = [column for column in step_input_columns(step_type, cfg) if column not in available]
+
+    source = (sources or {}).get(cfg.get("source"))
+    if step_type == "join" and source and source_columns(source):
+        other = set(source_columns(source))
+        referenced = join_keys(cfg)[1] + [c for c in cfg.get("columns") or [] if c not in join_keys(cfg)[1]]
+        missing += [f"{source.name}.{column}" for column in referenced if column not in other]
+    return missing
+
+
+def _lossless_cast(series, dtype):
+    """
+    Casts a column to a cached dtype if no values change in the process; returns None otherwise.
+
+    Allowed: anything to object, int/bool to float, float holding only whole numbers to int (to the
+    nullable Int64 if it has missing values), bools with missing values to the nullable boolean, and
+    all-null columns to any dtype (nullable for int/bool).
+    """
+    import numpy as np
+    import pandas as pd
+
+    try:
+        expected = pd.api.types.pandas_dtype(dtype)
+    except TypeError:
+        return None
+    found = series.dtype.kind
+    target = expected.kind
+
+    try:
+        if series.isna().all():
+            # Keep the missing values missing: int and bool need their nullable counterparts
+            return series.astype({"i": "Int64", "u": "Int64", "b": "boolean"}.get(target, expected))
+        if target == "O":
+            return series.astype(expected)
+        if target == "f" and found in "iub":
+            return series.astype(expected)
+        if target == "b" and found == "O":
+            # Booleans with missing values arrive as object; like ints, they go to the nullable dtype
+            if not all(isinstance(value, (bool, np.bool_)) for value in series.dropna()):
+                return None
+            return series.astype("boolean")
+        if target in "iu" and found == "f":
+            values = series.dropna()
+            if not (values == values.round()).all():
+                return None
+            return series.astype(expected if len(values) == len(series) else "Int64")
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return None
+
+
+def apply_schema(df, source):
+    """
+    Checks a freshly flattened DataFrame against the cached schema of its DataSource and casts
+    the columns to the cached dtypes. Columns not in the schema are kept after the known ones.
+
+    Raises SchemaDriftError if columns are missing or their values no longer fit the cached dtype
+    without losing data (e.g. 9.99 in an int64 column, or "no" in a bool column).
+    """
+    schema = source.schema or {}
+    missing_columns = [column for column in source_columns(source) if column not in df.columns]
+
+    casted = {}
+    dtype_changes = []
+    for column, dtype in schema.items():
+        if column not in df.columns or str(df[column].dtype) == dtype:
+            continue
+        series = _lossless_cast(df[column], dtype)
+        if series is None:
+            dtype_changes.append({"column": column, "expected": dtype, "found": str(df[column].dtype)})
+        else:
+            casted[column] = series
+
+    if missing_columns or dtype_changes:
+        raise SchemaDriftError(source, missing_columns, dtype_changes)
+
+    for column, series in casted.items():
+        df[column] = series
+
+    known = [column for column in schema if column in df.columns]
+    return df[known + [column for column in df.columns if column not in schema]]
@@ -0,0 +1,214 @@
+import math
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import ActiveRun, RateLimitBucket
+
+"""
+throttle.py – Admission control for preset runs.
+
+Every run of a preset is checked against three scopes before any data is fetched:
+
+- "source": each DataSource the preset reads from (protects the upstream API and its paid tokens)
+- "preset": the DataPreset itself
+- "user":   the requesting user, or the client IP for anonymous requests
+
+Each scope has two limits, configured in settings.EASYDEED_RATE_LIMITS:
+
+1. A token bucket (`rate` tokens per second, at most `burst` tokens) limiting how often runs may start.
+2. `max_concurrent`, the number of runs allowed at the same time.
+
+State is kept in the database (RateLimitBucket and ActiveRun), so the limits are shared by all workers.
+User buckets that are full and idle are deleted again, since anonymous clients get one per IP address.
+Every admission check locks the bucket rows of its scopes first (see _lock_buckets), so concurrent workers
+cannot both see a free slot or the same token.
+
+Short bursts are queued: a request waits up to settings.EASYDEED_RATE_LIMIT_MAX_WAIT seconds for a token
+or a free slot. Waiting ties up a worker, so each user may only have EASYDEED_RATE_LIMIT_MAX_QUEUED requests
+waiting at a time; any further request is rejected right away. Rejections raise RateLimited, which the view
+turns into a 429 response with Retry-After.
+"""
+
+# Seconds between checks for a free concurrency slot while queued
+SLOT_POLL_INTERVAL = 0.1
+
+# ActiveRun scope used to count the requests a user has waiting in the queue
+QUEUE_SCOPE = "queue"
+
+
+class RateLimited(Exception):
+    """
+    Raised when a run is not admitted. `retry_after` is the number of seconds the client should wait.
+    """
+
+    def __init__(self, scope, retry_after, reason):
+        self.scope = scope
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f'{reason} for {scope}')
+
+    def to_dict(self):
+        return {"error": str(self), "scope": self.scope, "retry_after": self.retry_after}
+
+
+def get_limits(scope, override=None):
+    limits = dict(settings.EASYDEED_RATE_LIMITS.get(scope, {}))
+    limits.update(override or {})
+    return limits
+
+
+def run_scopes(preset, sources, user_key):
+    """
+    Returns the (scope, key, limits) triples that apply to a run, in a fixed order so that
+    concurrent runs always lock buckets in the same order.
+    """
+    scopes = [("user", str(user_key), get_limits("user")), ("preset", str(preset.pk), get_limits("preset"))]
+    for source in sorted(sources, key=lambda s: s.pk):
+        scopes.append(("source", str(source.pk), get_limits("source", source.config.get("rate_limit"))))
+    return scopes
+
+
+def _ensure_buckets(scopes):
+    now = time.time()
+    for scope, key, limits in scopes:
+        RateLimitBucket.objects.get_or_create(
+            scope=scope, key=key, defaults={"tokens": limits.get("burst") or 0, "refilled": now}
+        )
+
+
+def _lock_buckets(scopes):
+    """
+    Locks the bucket rows of the scopes for the rest of the transaction and returns them.
+
+    The no-op UPDATE takes a row lock on databases with row locking, and makes SQLite take its write lock
+    at the start of the transaction, instead of failing with "database is locked" when a read
+    transaction later tries to write. Rows are locked in the fixed order of run_scopes().
+    """
+    for scope, key, limits in scopes:
+        RateLimitBucket.objects.filter(scope=scope, key=key).update(refilled=F("refilled"))
+    lookup = Q()
+    for scope, key, limits in scopes:
+        lookup |= Q(scope=scope, key=key)
+    return {(bucket.scope, bucket.key): bucket for bucket in RateLimitBucket.objects.filter(lookup)}
+
+
+def _prune_buckets(user_scope, now):
+    """
+    Deletes the buckets of users (mostly anonymous clients, keyed by IP) that have been idle long enough to be
+    full again and have nothing running or queued, so the table does not keep a row for every client that
+    ever called the endpoint. A deleted bucket is recreated full, which is the state it was in.
+    """
+    scope, key, limits = user_scope
+    rate, burst = limits.get("rate"), limits.get("burst")
+    idle = burst / rate if rate and burst else 0
+    busy = ActiveRun.objects.filter(scope__in=(scope, QUEUE_SCOPE)).values("key")
+    RateLimitBucket.objects.filter(scope=scope, refilled__lt=now - idle).exclude(key=key).exclude(key__in=busy).delete()
+
+
+def _try_admit(scopes):
+    """
+    One admission attempt. Either registers an ActiveRun in every scope with a concurrency limit and takes
+    a token from every bucket, or changes nothing. Returns (runs, None) when admitted, otherwise
+    (None, (scope, seconds to wait, reason)) for the slowest limit.
+    """
+    now = time.time()
+    expires = timezone.now() + timedelta(seconds=settings.EASYDEED_RUN_TIMEOUT)
+    with transaction.atomic():
+        buckets = _lock_buckets(scopes)
+        if len(buckets) < len(scopes):
+            # Pruned by another worker since _ensure_buckets()
+            _ensure_buckets(scopes)
+            buckets = _lock_buckets(scopes)
+        ActiveRun.objects.filter(expires__lt=timezone.now()).delete()
+        _prune_buckets(scopes[0], now)
+
+        for scope, key, limits in scopes:
+            max_concurrent = limits.get("max_concurrent")
+            if max_concurrent and ActiveRun.objects.filter(scope=scope, key=key).count() >= max_concurrent:
+                return None, (scope, SLOT_POLL_INTERVAL, "Too many concurrent runs")
+
+        wait = None
+        limited = []
+        for scope, key, limits in scopes:
+            rate, burst = limits.get("rate"), limits.get("burst")
+            if not rate or not burst:
+                continue
+            bucket = buckets[(scope, key)]
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.refilled) * rate)
+            bucket.refilled = now
+            limited.append(bucket)
+            if bucket.tokens < 1:
+                seconds = (1 - bucket.tokens) / rate
+                if wait is None or seconds > wait[1]:
+                    wait = (scope, seconds, "Rate limit exceeded")
+
+        if wait is None:
+            for bucket in limited:
+                bucket.tokens -= 1
+        for bucket in limited:
+            bucket.save(update_fields=["tokens", "refilled"])
+        if wait is not None:
+            return None, wait
+
+        runs = ActiveRun.objects.bulk_create(
+            ActiveRun(scope=scope, key=key, expires=expires)
+            for scope, key, limits in scopes
+            if limits.get("max_concurrent")
+        )
+    return runs, None
+
+
+def _join_queue(user_scope):
+    """
+    Registers a waiting request of a user, or raises RateLimited if the user already has
+    EASYDEED_RATE_LIMIT_MAX_QUEUED requests waiting.
+    """
+    scope, key, limits = user_scope
+    expires = timezone.now() + timedelta(seconds=settings.EASYDEED_RATE_LIMIT_MAX_WAIT + 1)
+    with transaction.atomic():
+        _lock_buckets([user_scope])
+        waiting = ActiveRun.objects.filter(scope=QUEUE_SCOPE, key=key, expires__gte=timezone.now()).count()
+        if waiting >= settings.EASYDEED_RATE_LIMIT_MAX_QUEUED:
+            raise RateLimited(scope, settings.EASYDEED_RATE_LIMIT_MAX_WAIT, "Too many queued requests")
+        return ActiveRun.objects.create(scope=QUEUE_SCOPE, key=key, expires=expires)
+
+
+@contextmanager
+def admit_run(preset, sources, user_key):
+    """
+    Context manager wrapping a preset run. Queues the request for up to EASYDEED_RATE_LIMIT_MAX_WAIT
+    seconds if needed, raises RateLimited if it cannot be admitted, and frees the concurrency slots
+    when the run is done.
+    """
+    scopes = run_scopes(preset, sources, user_key)
+    deadline = time.monotonic() + settings.EASYDEED_RATE_LIMIT_MAX_WAIT
+    queued = None
+
+    try:
+        _ensure_buckets(scopes)
+        while True:
+            runs, wait = _try_admit(scopes)
+            if runs is not None:
+                break
+            scope, seconds, reason = wait
+            if time.monotonic() + seconds > deadline:
+                raise RateLimited(scope, seconds, reason)
+            if queued is None:
+                queued = _join_queue(scopes[0])
+            time.sleep(seconds)
+    except OperationalError:
+        # The database stayed locked by other workers for longer than its timeout
+        raise RateLimited("throttle", 1, "Rate limiter busy")
+    finally:
+        if queued is not None:
+            queued.delete()
+
+    try:
+        yield
+    finally:
+        ActiveRun.objects.filter(pk__in=[run.pk for run in runs]).delete()
@@ -0,0 +1,346 @@
+from .memory import MB, MemoryBudgetExceeded, SpilledFrame, frame_bytes
+from .schema import join_config_error, join_keys
+
+# pandas is imported where it is needed; see utils/data_import.py
+
+"""
+transform.py – Applies TransformationSteps to a DataFrame.
+
+run_steps() is the execution engine behind run_preset: it applies each step of a preset, in order,
+to the DataFrame of the preset's main DataSource. Steps that combine data (join, union) look up the
+other DataFrames by DataSource name in `frames`, which holds every source fetched for the run.
+
+With a memory budget, the working DataFrame is measured after every step and spilled to disk when it
+grows beyond the budget (see utils/memory.py). While spilled, row-wise steps (CHUNKED_STEPS) run one
+chunk at a time, and group_by with decomposable aggregations is computed from per-chunk partial results.
+Any other step needs the whole frame back in memory and aborts with MemoryBudgetExceeded if it does not fit.
+"""
+
+
+# Aggregation functions available to group_by and pivot steps
+AGGREGATIONS = ("sum", "mean", "count", "min", "max", "nunique")
+
+# Steps that work row by row and can therefore be applied to each chunk of a spilled frame separately
+CHUNKED_STEPS = ("rename_columns", "drop_columns", "explode_column", "join")
+
+# How per-chunk partial aggregates are combined; mean is split into a sum and a count
+PARTIAL_COMBINE = {"sum": "sum", "count": "sum", "min": "min", "max": "max"}
+
+
+def _is_name_list(value):
+    return isinstance(value, list) and all(isinstance(name, str) for name in value)
+
+
+def _is_names(value):
+    # A column name or a non-empty list of them, as accepted by _as_list() in utils/schema.py
+    return isinstance(value, str) and value != "" or _is_name_list(value) and value != []
+
+
+def step_config_error(step_type, cfg):
+    """
+    Returns a description of what is wrong with the structure of a step config, or None if it is usable.
+    Columns are not checked here, see utils/schema.py.
+    """
+    if step_type in ("drop_columns", "reorder_columns") and not _is_name_list(cfg.get("columns", [])):
+        return '"columns" must be a list of column names'
+    if step_type == "rename_columns":
+        mapping = cfg.get("mapping", {})
+        if not isinstance(mapping, dict) or not all(isinstance(new, str) for new in mapping.values()):
+            return '"mapping" must be an object of {"old_column": "new_column"}'
+    if step_type == "remove_duplicates" and cfg.get("subset") is not None and not _is_name_list(cfg["subset"]):
+        return '"subset" must be a list of column names'
+    if step_type in ("explode_column", "filter_rows") and not isinstance(cfg.get("column", ""), str):
+        return '"column" must be a column name'
+    if step_type == "add_columns" and not all(isinstance(cfg.get(key, ""), str) for key in ("new_column", "formula")):
+        return '"new_column" and "formula" must be strings'
+
+    if step_type in ("join", "union") and not isinstance(cfg.get("source"), str):
+        return f'A {step_type} needs the name of one of the preset\'s additional sources as "source"'
+    if step_type == "join":
+        return join_config_error(cfg)
+
+    if step_type == "group_by":
+        aggregations = cfg.get("aggregations", {})
+        well_formed = isinstance(aggregations, dict) and all(
+            isinstance(spec, list) and len(spec) == 2 and all(isinstance(part, str) for part in spec)
+            for spec in aggregations.values()
+        )
+        if not _is_names(cfg.get("by")) or not well_formed:
+            return 'A group_by needs "by" and "aggregations" as {"output_column": ["column", "function"]}'
+        funcs = [spec[1] for spec in aggregations.values()]
+    elif step_type == "pivot":
+        if not all(_is_names(cfg.get(key)) for key in ("index", "columns", "values")):
+            return 'A pivot needs "index", "columns" and "values", each a column name or a list of column names'
+        funcs = [cfg.get("aggfunc", "sum")]
+    else:
+        return None
+
+    unsupported = [func for func in funcs if func not in AGGREGATIONS]
+    if unsupported:
+        return f"Unsupported aggregation(s): {', '.join(map(str, unsupported))}. Use one of: {', '.join(AGGREGATIONS)}"
+    return None
+
+
+def hash_join(left, right, cfg):
+    """
+    Joins `right` onto `left` using pandas' vectorized hash join.
+
+    Config:
+    - on: list (or str) of key columns present in both frames, or left_on/right_on for differently named keys
+    - how: "inner" (default) or "left"
+    - columns: optional list of columns to take from the right side (keys are always included)
+    - suffix: appended to right-side columns that clash with left-side names (default "__right")
+
+    To keep memory down, the right side is reduced to the requested columns and, for inner joins,
+    the larger side is filtered to the keys present in the smaller one before the join.
+    """
+    error = join_config_error(cfg)
+    if error:
+        raise ValueError(error)
+    left_on, right_on = join_keys(cfg)
+    how = cfg.get("how", "inner")
+
+    if cfg.get("columns"):
+        right = right[right_on + [c for c in cfg["columns"] if c not in right_on]]
+
+    if how == "inner":
+        if len(left) <= len(right):
+            right = right[_key_index(right, right_on).isin(_key_index(left, left_on))]
+        else:
+            left = left[_key_index(left, left_on).isin(_key_index(right, right_on))]
+
+    df = left.merge(
+        right, how=how, left_on=left_on, right_on=right_on, sort=False,
+        suffixes=("", cfg.get("suffix", "__right")),
+    )
+    # Keep a single copy of the keys when they are named differently on each side
+    return df.drop(columns=[c for l, c in zip(left_on, right_on) if l != c and c not in left.columns])
+
+
+def group_by(df, cfg):
+    """
+    Groups rows by one or more key columns and aggregates the other columns with pandas' grouped kernels.
+
+    Config:
+    - by: list (or str) of key columns
+    - aggregations: {output_column: [input_column, function]}, function being one of AGGREGATIONS
+    """
+    by, aggregations = _group_spec(cfg)
+    grouped = df.groupby(by, sort=False, dropna=False, observed=True)
+    if not aggregations:
+        return grouped.size().reset_index(name="count")
+    return grouped.agg(**aggregations).reset_index()
+
+
+def _group_spec(cfg):
+    by = [cfg["by"]] if isinstance(cfg["by"], str) else list(cfg["by"])
+    aggregations = cfg.get("aggregations", {})
+    if not isinstance(aggregations, dict) or not all(
+        isinstance(spec, (list, tuple)) and len(spec) == 2 for spec in aggregations.values()
+    ):
+        raise ValueError('"aggregations" must be {"output_column": ["column", "function"]}')
+    aggregations = {name: tuple(spec) for name, spec in aggregations.items()}
+    for name, (column, func) in aggregations.items():
+        if func not in AGGREGATIONS:
+            raise ValueError(f'Unsupported aggregation "{func}" for "{name}"')
+    return by, aggregations
+
+
+def can_group_by_chunks(cfg):
+    """
+    True if every aggregation of a group_by step can be combined from per-chunk results (i.e. no nunique).
+    """
+    by, aggregations = _group_spec(cfg)
+    return all(func != "nunique" for column, func in aggregations.values())
+
+
+def group_by_chunks(chunks, cfg):
+    """
+    Computes a group_by step over an iterable of chunks: each chunk is reduced to partial aggregates,
+    which are then combined. Only one chunk is in memory at a time.
+    """
+    import pandas as pd
+
+    by, aggregations = _group_spec(cfg)
+    if not aggregations:
+        partial_specs = {"count": (by[0], "size")}
+        combine = {"count": ("count", "sum")}
+    else:
+        partial_specs, combine = {}, {}
+        for name, (column, func) in aggregations.items():
+            parts = {"sum": "sum", "count": "count"} if func == "mean" else {func: func}
+            for part, part_func in parts.items():
+                partial_name = f"{name}__{part}" if func == "mean" else name
+                partial_specs[partial_name] = (column, part_func)
+                combine[partial_name] = (partial_name, PARTIAL_COMBINE[part_func])
+
+    partials = [
+        chunk.groupby(by, sort=False, dropna=False, observed=True).agg(**partial_specs).reset_index()
+        for chunk in chunks
+    ]
+    df = pd.concat(partials, ignore_index=True).groupby(by, sort=False, dropna=False).agg(**combine)
+
+    for name, (column, func) in aggregations.items():
+        if func == "mean":
+            df[name] = df[f"{name}__sum"] / df[f"{name}__count"]
+    return df[list(aggregations) or ["count"]].reset_index()
+
+
+def pivot(df, cfg):
+    """
+    Pivots the distinct values of one column into columns, aggregating `values` per cell.
+
+    Config:
+    - index: list (or str) of columns that identify a row in the output
+    - columns: column whose values become the new columns
+    - values: column to aggregate
+    - aggfunc: one of AGGREGATIONS (default "sum")
+    - fill_value: optional value for empty cells
+    """
+    aggfunc = cfg.get("aggfunc", "sum")
+    if aggfunc not in AGGREGATIONS:
+        raise ValueError(f'Unsupported aggregation "{aggfunc}"')
+
+    table = df.pivot_table(
+        index=cfg["index"], columns=cfg["columns"], values=cfg["values"],
+        aggfunc=aggfunc, fill_value=cfg.get("fill_value"), observed=True,
+    )
+    table.columns = [str(column) for column in table.columns]
+    return table.reset_index()
+
+
+def _key_index(df, keys):
+    import pandas as pd
+
+    if len(keys) == 1:
+        return pd.Index(df[keys[0]])
+    return pd.MultiIndex.from_frame(df[keys])
+
+
+def apply_step(df, step_type, cfg, frames=None):
+    """
+    Applies a single transformation step and returns the resulting DataFrame.
+    """
+    if step_type == "rename_columns":
+        df = df.rename(columns=cfg.get("mapping", {}))
+    elif step_type == "drop_columns":
+        df = df.drop(columns=cfg.get("columns", []), errors="ignore")
+    elif step_type == "explode_column":
+        col = cfg.get("column")
+        if col in df.columns:
+            df = df.explode(col)
+    elif step_type == "join":
+        df = hash_join(df, frames[cfg["source"]], cfg)
+    elif step_type == "union":
+        import pandas as pd
+        df = pd.concat([df, frames[cfg["source"]]], ignore_index=True, sort=False)
+    elif step_type == "group_by":
+        df = group_by(df, cfg)
+    elif step_type == "pivot":
+        df = pivot(df, cfg)
+    return df
+
+
+def run_steps(df, steps, frames=None, budget=None):
+    """
+    Applies the steps (TransformationStep instances, already ordered) to df.
+
+    With a budget (bytes), every frame in `frames` counts against it, the working frame is spilled to disk
+    whenever it exceeds the rest, and MemoryBudgetExceeded is raised if the work cannot fit. Spilling can
+    only free df if nothing else refers to it; see run_source_steps().
+    """
+    return _run_steps([df], steps, frames, budget)
+
+
+def run_source_steps(frames, name, steps, budget=None):
+    """
+    Applies the steps to frames[name], like run_steps(). The frame is taken out of `frames` and the frames
+    of sources no step uses are dropped, so that a spilled frame is actually released and only the frames
+    still needed count against the budget.
+    """
+    used = {step.config.get("source") for step in steps if step.step_type in ("join", "union")}
+    # Passed in a list that _run_steps() empties, since the caller of a function holds on to its arguments
+    holder = [frames[name] if name in used else frames.pop(name)]
+    for other in [other for other in frames if other not in used]:
+        del frames[other]
+    return _run_steps(holder, steps, frames, budget)
+
+
+def _run_steps(holder, steps, frames, budget):
+    df = holder.pop()
+    if budget is None:
+        for step in steps:
+            df = apply_step(df, step.step_type, step.config, frames)
+        return df
+
+    # Sources joined or appended are used whole, so they are kept in memory next to the working frame
+    available = budget - sum(frame_bytes(frame) for frame in (frames or {}).values())
+    if available <= 0:
+        raise MemoryBudgetExceeded(
+            f"The joined sources alone need more than the memory budget ({budget / MB:.1f} MB)", budget, budget - available
+        )
+
+    spilled = None
+    try:
+        if frame_bytes(df) > available:
+            spilled, df = SpilledFrame.from_frame(df, available), None
+
+        for step in steps:
+            if spilled is None:
+                df = apply_step(df, step.step_type, step.config, frames)
+                if frame_bytes(df) > available:
+                    spilled, df = SpilledFrame.from_frame(df, available), None
+                continue
+
+            if step.step_type in CHUNKED_STEPS or step.step_type == "union":
+                spilled = _run_chunked(spilled, step, frames, available)
+            elif step.step_type == "group_by" and can_group_by_chunks(step.config):
+                df = group_by_chunks(spilled.chunks(), step.config)
+                spilled.close()
+                spilled = None
+            else:
+                try:
+                    df = spilled.to_frame(available)
+                except MemoryBudgetExceeded as e:
+                    raise MemoryBudgetExceeded(
+                        f'Step {step.order} ({step.step_type}) needs all {spilled.rows} rows in memory: {e}',
+                        e.budget, e.needed,
+                    )
+                spilled.close()
+                spilled = None
+                df = apply_step(df, step.step_type, step.config, frames)
+
+            if df is not None and frame_bytes(df) > available:
+                spilled, df = SpilledFrame.from_frame(df, available), None
+
+        if spilled is not None:
+            df = spilled.to_frame(available)
+    finally:
+        if spilled is not None:
+            spilled.close()
+    return df
+
+
+def _run_chunked(spilled, step, frames, available):
+    """
+    Applies a row-wise step to every chunk of a spilled frame and returns the new spilled frame.
+    A union appends the other source as an extra chunk.
+    """
+    result = SpilledFrame()
+    try:
+        for chunk in spilled.chunks():
+            if step.step_type != "union":
+                chunk = apply_step(chunk, step.step_type, step.config, frames)
+                if frame_bytes(chunk) > available:
+                    raise MemoryBudgetExceeded(
+                        f"Step {step.order} ({step.step_type}) produced a chunk larger than the memory budget",
+                        available, frame_bytes(chunk),
+                    )
+            result.append(chunk)
+        if step.step_type == "union":
+            result.append(frames[step.config["source"]])
+    except Exception:
+        result.close()
+        raise
+    spilled.close()
+    return result
@@ -1,9 +1,16 @@
-import pandas as pd
-import requests
+import json
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404
 from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
 from .models import DataPreset
-from .utils.data_import import extract_flat_dataframe
+from .utils.data_import import fetch_sources
+from .utils.memory import MB, MemoryBudgetExceeded, memory_budget, result_bytes
+from .utils.preset_io import dump_preset, load_presets
+from .utils.schema import SchemaDriftError, apply_schema, infer_schema
+from .utils.throttle import RateLimited, admit_run
+from .utils.transform import run_source_steps, step_config_error
 
 """
 views.py – Core view logic for executing data transformation workflows via user-defined presets.
@@ -12,19 +19,32 @@ This module handles the following key responsibilities:
 
 1. run_preset(request, slug)
    - Retrieves a DataPreset based on the URL slug.
-   - Loads data from an associated DataSource (currently supports APIs).
+   - Admits the run only if the rate and concurrency limits of the source, the preset and the user allow it
+     (see utils/throttle.py). Rejected runs get a 429 response with a Retry-After header.
+   - Loads data from the associated DataSource and any additional sources of the preset, in parallel
+     (currently supports APIs).
    - Supports dynamic configuration of:
        - API URL and method
        - Optional root_key for extracting the main data list
        - Optional record_path and meta_fields for flattening nested lists using pandas.json_normalize
    - Automatically flattens the data into a pandas DataFrame.
+   - Checks the DataFrame against the cached schema of the DataSource (inferred and stored on the first run)
+     and reports schema drift as a structured JSON error instead of failing inside a step.
    - Applies a sequence of TransformationStep operations on the DataFrame, such as:
        - Renaming columns
        - Dropping columns
        - Exploding list columns
-       - (Support for more step types can be added here)
+       - Joining or appending the data of an additional source
+       - Aggregating and pivoting rows, so reports only return the totals
+       - (Support for more step types can be added in utils/transform.py)
+   - Keeps the run within its memory budget: oversized intermediate results are processed in chunks spilled
+     to disk, and runs that cannot fit are aborted with a 413 response (see utils/memory.py).
    - Returns the transformed data as a JSON response.
 
+2. export_presets(request) / import_presets(request)
+   - Staff-only endpoints to dump whole presets (sources + steps) as JSON and to load them back in bulk.
+   - Imports run in a single transaction and record a versioned PresetSnapshot per preset (see utils/preset_io.py).
+
 The goal of this view is to enable dynamic, reusable, and declarative data processing workflows,
 where end-users configure everything through the admin interface or UI – without writing code.
 
@@ -40,62 +60,142 @@ def run_preset(request, slug):
 
     Steps performed:
     1. Retrieves the DataPreset object using the provided slug.
-    2. Loads data from the associated DataSource (currently supports APIs via HTTP requests).
-    3. Optionally extracts a list from the response using `root_key`, and flattens nested structures using
+    2. Checks the rate and concurrency limits before anything is fetched. Short bursts are queued briefly;
+       otherwise a 429 response with Retry-After is returned.
+    3. Loads data from the associated DataSource and the preset's additional sources, in parallel
+       (currently supports APIs via HTTP requests).
+    4. Optionally extracts a list from the response using `root_key`, and flattens nested structures using
        `record_path` and `meta_fields` if provided in the DataSource config (Admin UI).
-    4. Converts the loaded data into a pandas DataFrame.
-    5. Applies each TransformationStep linked to the preset, in defined order. Supported step types include:
+    5. Converts the loaded data into a pandas DataFrame and validates it against the cached DataSource schema.
+       Missing columns or incompatible dtypes return a 409 response listing the drift.
+    6. Applies each TransformationStep linked to the preset, in defined order. Supported step types include:
         - rename_columns: Renames columns using a mapping
         - drop_columns: Removes specified columns
         - explode_column: Expands a list column into multiple rows
+        - join: Hash joins an additional source on key columns (inner or left)
+        - union: Appends the rows of an additional source
+        - group_by: Aggregates rows per key (sum/mean/count/min/max/nunique)
+        - pivot: Turns the values of a column into columns
         (At the time of writing 2025-05-06: More step types will be written into the final valid code and can be added dynamically via the admin interface)
-    6. Returns the final transformed DataFrame as a JSON response (list of records).
+       Intermediate results larger than the memory budget are spilled to disk and processed in chunks;
+       if the work cannot fit, a 413 response explains which step exceeded the budget.
+    7. Returns the final transformed DataFrame as a JSON response (list of records).
 
     Parameters:
         request: The Django HTTP request (GET or POST).
         slug (str): The slug identifier for the DataPreset to execute.
 
     Returns:
-        JsonResponse: Transformed data serialized as a list of JSON records.
+        JsonResponse: Transformed data serialized as a list of JSON records. The X-Preset-Version header holds
+        the content hash of the preset version that produced it, for keying caches.
 
     Notes:
         - All behavior is controlled by configuration stored in the database.
         - This function is intended to support repeatable, no-code data workflows.
     """
 
-    preset = get_object_or_404(DataPreset, slug=slug)
+    preset = get_object_or_404(DataPreset.objects.select_related('source', 'current_snapshot'), slug=slug)
     source = preset.source
+    sources = [source] + [s for s in preset.sources.all() if s.pk != source.pk]
 
-    if source.source_type == "api":
-        config = source.config
-        url = config.get("url")
-        method = config.get("method", "GET").upper()
-        headers = config.get("headers", {})
-        params = config.get("params", {})
-        root_key = config.get("root_key")
-        record_path = config.get("record_path")
-        meta_fields = config.get("meta_fields")
-
+    if all(s.source_type == "api" for s in sources):
+        user_key = request.user.pk if request.user.is_authenticated else f'ip:{request.META.get("REMOTE_ADDR")}'
         try:
-            response = requests.request(method, url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-        except Exception as e:
-            return JsonResponse({"error": str(e)}, status=400)
-
-        df = extract_flat_dataframe(data, root_key, record_path, meta_fields)
-
-        for step in preset.steps.order_by("order"):
-            cfg = step.config
-            if step.step_type == "rename_columns":
-                df.rename(columns=cfg.get("mapping", {}), inplace=True)
-            elif step.step_type == "drop_columns":
-                df.drop(columns=cfg.get("columns", []), inplace=True, errors="ignore")
-            elif step.step_type == "explode_column":
-                col = cfg.get("column")
-                if col in df.columns:
-                    df = df.explode(col)
-
-        return JsonResponse(df.to_dict(orient="records"), safe=False)
+            with admit_run(preset, sources, user_key):
+                response = _execute_preset(preset, sources)
+            if preset.current_snapshot:
+                response["X-Preset-Version"] = preset.current_snapshot.content_hash
+            return response
+        except RateLimited as e:
+            response = JsonResponse(e.to_dict(), status=429)
+            response["Retry-After"] = str(e.retry_after)
+            return response
 
     return JsonResponse({"error": "Unsupported source type"}, status=400)
+
+
+def _execute_preset(preset, sources):
+    """
+    Checks the steps, fetches the data of all sources and applies the steps to the main source.
+    Called by run_preset once the run is admitted.
+    """
+    steps = list(preset.steps.order_by("order"))
+    for step in steps:
+        # Steps saved before the form checked their structure
+        error = step_config_error(step.step_type, step.config) if isinstance(step.config, dict) else "not an object"
+        if error:
+            return JsonResponse({"error": f"Step {step.order} ({step.step_type}) is invalid: {error}"}, status=400)
+    unknown = {step.config.get("source") for step in steps if step.step_type in ("join", "union")} - {s.name for s in sources}
+    if unknown:
+        return JsonResponse({"error": f"Steps reference sources not added to the preset: {', '.join(sorted(map(str, unknown)))}"}, status=400)
+
+    budget = memory_budget(preset)
+    try:
+        frames = fetch_sources(sources, budget)
+    except MemoryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=413)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    for source in sources:
+        try:
+            frames[source.name] = apply_schema(frames[source.name], source)
+        except SchemaDriftError as e:
+            return JsonResponse(e.to_dict(), status=409)
+
+        if not source.schema:
+            # First run against this source: cache its schema for later runs and step validation
+            source.schema = infer_schema(frames[source.name])
+            source.schema_updated = timezone.now()
+            source.save(update_fields=["schema", "schema_updated"])
+
+    try:
+        # Hands the frames over, so the main frame can be released once it is spilled to disk
+        df = run_source_steps(frames, preset.source.name, steps, budget)
+        frames.clear()  # Only the result is needed from here on
+        if budget is not None and result_bytes(df) > budget:
+            raise MemoryBudgetExceeded(
+                f"The result ({len(df)} rows) is too large to return within the memory budget ({budget / MB:.1f} MB)",
+                budget, result_bytes(df),
+            )
+    except MemoryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=413)
+    except (KeyError, ValueError, TypeError) as e:
+        # e.g. a missing column, or sum/mean on a text column
+        return JsonResponse({"error": f"Step failed: {e}"}, status=400)
+
+    return JsonResponse(df.to_dict(orient="records"), safe=False)
+
+
+@require_GET
+def export_presets(request):
+    """
+    Returns the selected presets (?slug=a&slug=b, default: all) as {"presets": [...]}.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff access required"}, status=403)
+
+    presets = DataPreset.objects.select_related('source').prefetch_related('sources', 'steps').order_by('name')
+    slugs = request.GET.getlist('slug')
+    if slugs:
+        presets = presets.filter(slug__in=slugs)
+    return JsonResponse({"presets": [dump_preset(preset) for preset in presets]})
+
+
+@require_POST
+def import_presets(request):
+    """
+    Creates or updates presets from a JSON body in the export format, all in one transaction.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff access required"}, status=403)
+
+    try:
+        snapshots = load_presets(json.loads(request.body), user=request.user)
+    except (json.JSONDecodeError, ValueError, KeyError, TypeError, IntegrityError) as e:
+        return JsonResponse({"error": f"Import failed: {e}"}, status=400)
+
+    return JsonResponse({"imported": [
+        {"slug": snapshot.preset.slug, "version": snapshot.version, "content_hash": snapshot.content_hash}
+        for snapshot in snapshots
+    ]})
@@ -0,0 +1,68 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+
+"""
+warmup.py – Optional warm-up of a worker before it accepts traffic.
+
+pandas and requests are imported lazily on the first preset run (see utils/data_import.py), which keeps
+boot time and memory low for short-lived workers. Workers that should answer the first request quickly
+can instead be warmed up when they boot:
+
+- settings.EASYDEED_WARMUP = True makes easydeed/wsgi.py and easydeed/asgi.py call warm_up() right after
+  the application is created.
+- settings.EASYDEED_WARMUP_PRESETS lists the slugs of the hot presets. Their steps are run once on empty
+  DataFrames built from the cached source schemas, which loads the pandas code paths they use and checks
+  that the presets still compile against the schemas.
+- `python manage.py warmup` runs the same warm-up and reports the timings.
+
+The warm-up runs from the WSGI/ASGI modules rather than DataprepConfig.ready(), since it queries the database.
+It never raises: database errors and failing presets are logged as warnings, so a worker always boots.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(slugs=None):
+    """
+    Imports the heavy dependencies and dry-runs the given presets (default: EASYDEED_WARMUP_PRESETS).
+    Returns a dict of timings in seconds: {"imports": ..., "<slug>": ...}.
+    """
+    from .models import DataPreset
+    from .utils.schema import empty_frame
+    from .utils.transform import run_steps
+
+    timings = {}
+    start = time.perf_counter()
+    import pandas  # noqa: F401
+    import requests  # noqa: F401
+    timings["imports"] = time.perf_counter() - start
+
+    if slugs is None:
+        slugs = settings.EASYDEED_WARMUP_PRESETS
+
+    try:
+        presets = list(
+            DataPreset.objects.filter(slug__in=slugs).select_related("source").prefetch_related("steps", "sources")
+        )
+    except DatabaseError as e:
+        # e.g. migrations not applied yet; the worker must still boot
+        logger.warning("Skipping preset warm-up: %s", e)
+        return timings
+
+    for preset in presets:
+        start = time.perf_counter()
+        try:
+            sources = [preset.source, *preset.sources.all()] if preset.source else []
+            frames = {source.name: empty_frame(source.schema) for source in sources if source.schema}
+            if preset.source and preset.source.name in frames:
+                run_steps(frames[preset.source.name], sorted(preset.steps.all(), key=lambda step: step.order), frames)
+            else:
+                logger.info('Skipping warm-up of preset "%s": no cached schema', preset.slug)
+        except Exception as e:
+            logger.warning('Warm-up of preset "%s" failed: %s', preset.slug, e)
+        timings[preset.slug] = time.perf_counter() - start
+
+    return timings
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'easydeed.settings')
 
 application = get_asgi_application()
+
+# Optionally load pandas/requests and the hot presets before the worker accepts traffic
+if settings.EASYDEED_WARMUP:
+    from dataprep.warmup import warm_up
+    warm_up()
+
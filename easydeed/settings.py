@@ -137,3 +137,37 @@ MEDIA_URL = '/media/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Admission control for running presets (dataprep/utils/throttle.py)
+# rate: tokens refilled per second, burst: bucket size, max_concurrent: runs allowed at the same time.
+# Set any value to None to disable that limit. A DataSource can override its limits with a
+# "rate_limit" object in its config, e.g. {"rate": 0.5, "burst": 2, "max_concurrent": 1}.
+EASYDEED_RATE_LIMITS = {
+    'source': {'rate': 1.0, 'burst': 5, 'max_concurrent': 2},
+    'preset': {'rate': 1.0, 'burst': 5, 'max_concurrent': 2},
+    'user': {'rate': 2.0, 'burst': 10, 'max_concurrent': 4},
+}
+
+# Seconds a request may wait in line for a token or a free slot before it is rejected with 429
+EASYDEED_RATE_LIMIT_MAX_WAIT = 2.0
+
+# Requests per user that may wait in line at the same time (each one holds a worker); further ones get a 429
+EASYDEED_RATE_LIMIT_MAX_QUEUED = 1
+
+# Seconds after which the concurrency slot of a run that never finished is reclaimed
+EASYDEED_RUN_TIMEOUT = 300
+
+
+# Worker warm-up (dataprep/warmup.py)
+# When enabled, wsgi.py/asgi.py import pandas/requests and dry-run the listed presets (by slug)
+# before the worker accepts traffic. When disabled, they are loaded on the first preset run.
+EASYDEED_WARMUP = False
+EASYDEED_WARMUP_PRESETS = []
+
+
+# Memory budget per preset run in MB (dataprep/utils/memory.py), shared by all its fetches, steps and the
+# response. Larger intermediate results are processed in chunks spilled to temporary files; runs that
+# cannot fit are aborted with a 413.
+# A preset can lower it with DataPreset.memory_budget_mb. None disables the budget.
+EASYDEED_MEMORY_BUDGET_MB = 512
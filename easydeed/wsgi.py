@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'easydeed.settings')
 
 application = get_wsgi_application()
+
+# Optionally load pandas/requests and the hot presets before the worker accepts traffic
+if settings.EASYDEED_WARMUP:
+    from dataprep.warmup import warm_up
+    warm_up()
+